@@ -1,12 +1,46 @@
 import os
-import random
+import time
+import asyncio
 import datetime as _dt
+from dataclasses import dataclass, field
 from pathlib import Path
+from collections.abc import AsyncIterable
+from typing import TYPE_CHECKING, Awaitable, Callable
 
-from playwright.async_api import async_playwright, Playwright, Page
-from playwright_stealth import Stealth
+from playwright.async_api import Playwright, Page
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from pydantic import BaseModel
 
+from app.cache import case_key
+from app.direct_fetch import DirectScheduleClient
+from app.pacing import PACING_PROFILES, PacingController, PacingProfile, Pacer
+from app.page_state import (
+    BACKOFF,
+    CAPTCHA,
+    DISMISS,
+    FORM,
+    HUMAN,
+    MODAL,
+    RESULTS,
+    ROTATE,
+    PageStateError,
+    detect_page_state,
+    dismiss_modal,
+    recovery_for,
+    wait_for_human,
+    wait_for_page_state,
+)
+from app.records import NoData, Schedule, ScheduleError, ScheduleResult, schedule_from_rows
+from app.timing import timed
+
+if TYPE_CHECKING:
+    from app.browser_pool import BrowserPool, ShardedBrowserPool
+
+
+# Home page of the Oficina Judicial Virtual; overridable to point at a local replica
+# (see benchmarks/scrape_mock.py).
+PJUD_HOME_URL = os.getenv("PJUD_HOME_URL", "https://oficinajudicialvirtual.pjud.cl/home/index.php")
+
 
 def _ts() -> str:
     return _dt.datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -29,6 +63,51 @@ async def _dump_debug(page: Page, label: str) -> None:
         return
 
 
+@dataclass
+class ScrapeStats:
+    """Counters for a single `playwright_start_process` run, reported in the webhook payload."""
+
+    cases: int = 0
+    concurrency: int = 1
+    elapsed_seconds: float = 0.0
+    direct_fetch_hits: int = 0
+    direct_fetch_fallbacks: int = 0
+    extraction_round_trips: int = 0
+    extraction_round_trips_per_cell: int = 0
+    retries: int = 0
+    failed_cases: int = 0
+    pacing_profile: str = ""
+    pacing_seconds: float = 0.0
+    network_seconds: float = 0.0
+    # Form fields left as they were because the previous case on the page used the same value.
+    form_changes_avoided: int = 0
+    # Page states found when a step failed (captcha, modal, ...) and recoveries applied.
+    page_states: dict[str, int] = field(default_factory=dict)
+    recoveries: dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        minutes = self.elapsed_seconds / 60
+        return {
+            "cases": self.cases,
+            "concurrency": self.concurrency,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "direct_fetch_hits": self.direct_fetch_hits,
+            "direct_fetch_fallbacks": self.direct_fetch_fallbacks,
+            "extraction_round_trips": self.extraction_round_trips,
+            "extraction_round_trips_per_cell": self.extraction_round_trips_per_cell,
+            "retries": self.retries,
+            "failed_cases": self.failed_cases,
+            "pacing_profile": self.pacing_profile,
+            "pacing_seconds": round(self.pacing_seconds, 3),
+            "network_seconds": round(self.network_seconds, 3),
+            "form_changes_avoided": self.form_changes_avoided,
+            "page_states": self.page_states,
+            "recoveries": self.recoveries,
+            "cases_per_minute": round(self.cases / minutes, 2) if minutes else None,
+        }
+
+
+@timed("browser_connect")
 async def _init_browser_and_page(
     p: Playwright,
     *,
@@ -48,76 +127,193 @@ async def _init_browser_and_page(
         while cdp_url.endswith("/.") or cdp_url.endswith("/"):
             cdp_url = cdp_url[:-2] if cdp_url.endswith("/.") else cdp_url[:-1]
 
-        browser = await p.chromium.connect_over_cdp(cdp_url, slow_mo=1000)
+        browser = await p.chromium.connect_over_cdp(cdp_url)
         # Reuse a persistent context if available (better for captcha/session).
         if getattr(browser, "contexts", None) and browser.contexts:
             context = browser.contexts[0]
         else:
-            context = await browser.new_context(
-                timezone_id="America/Santiago",
-                locale="es-CL",
-            )
+            context = await new_browser_context(browser)
         page = await context.new_page()
         return browser, page, True
 
-    browser = await p.chromium.launch(headless=headless, slow_mo=1000)
-    context = await browser.new_context(
+    browser = await p.chromium.launch(headless=headless)
+    context = await new_browser_context(browser)
+    page = await context.new_page()
+    return browser, page, False
+
+
+async def new_browser_context(browser):
+    """A fresh context (own cookies and session) with the portal's locale and timezone."""
+    return await browser.new_context(
         timezone_id="America/Santiago",
         locale="es-CL",
     )
-    page = await context.new_page()
-    return browser, page, False
 
 
-async def playwright_goto_courtroom_schedule_page(page: Page):
-    await page.goto("https://oficinajudicialvirtual.pjud.cl/home/index.php")
-    await page.wait_for_load_state("domcontentloaded")
-    await page.mouse.move(random.random() * 800, random.random() * 800)
+_RESULTS_TABLE_ID = "dtaTableDetalleProgSala"
+
+
+def _default_pacer() -> Pacer:
+    return PacingController(PACING_PROFILES["stealth"]).pacer()
 
-    await page.wait_for_selector('//*[@id="focus"]/button')
-    await page.click('//*[@id="focus"]/button')
-    await page.mouse.move(random.random() * 800, random.random() * 800)
-    await page.wait_for_selector('//*[@id="sidebar"]/ul/li[16]/a')
+
+@timed("goto_schedule_page")
+async def playwright_goto_courtroom_schedule_page(page: Page, pacer: Pacer | None = None):
+    pacer = pacer or _default_pacer()
+    # Clicks auto-wait for their target, so no separate wait_for_selector is needed.
+    await page.goto(PJUD_HOME_URL, wait_until="domcontentloaded")
+    await pacer.step(page)
+
+    await page.click("#focus > button")
+    await pacer.step(page)
+    # The sidebar entries have no ids; Programación de Sala is the 16th one.
     await page.click('//*[@id="sidebar"]/ul/li[16]/a')
-    await page.mouse.move(random.random() * 800, random.random() * 800)
+    try:
+        await wait_for_page_state(page, _RESULTS_TABLE_ID, FORM)
+    except PageStateError as e:
+        if e.state != MODAL:
+            raise
+        await dismiss_modal(page)
+    await pacer.step(page)
+
+
+# Flag the rows currently in the results table, so the next wait only accepts rows
+# rendered for the new consulta (never the previous case's).
+_MARK_STALE_ROWS_JS = """
+(tableId) => {
+  const table = document.getElementById(tableId);
+  if (table) for (const tr of table.querySelectorAll("tr")) tr.dataset.stale = "1";
+}
+"""
 
 
-async def playwright_find_courtroom_schedule(page: Page, case: dict):
-    await page.wait_for_selector('//*[@id="progComp"]')
-    await page.select_option('//*[@id="progComp"]', case["competency"])
-    await page.mouse.move(random.random() * 800, random.random() * 800)
+@timed("form_fill")
+async def playwright_find_courtroom_schedule(
+    page: Page,
+    case: dict,
+    pacer: Pacer | None = None,
+    *,
+    form: dict[str, str] | None = None,
+    submit: Callable[[Callable[[], Awaitable]], Awaitable] | None = None,
+) -> int:
+    """
+    Fill the form and submit it. Actions auto-wait for their control, so a page that
+    already shows the form costs no extra round-trips. Rows left in the results table
+    are flagged as stale first, for `playwright_get_courtroom_schedule` to wait on.
+    `submit`, if given, is awaited with the btnProgConsulta click instead of clicking
+    directly (used to capture the consulta request and nothing sent while filling).
+
+    `form` holds the values this page's form already has and is updated in place:
+    fields whose value did not change since the previous case are not sent again, and
+    a competency (or court) change forgets the fields after it, since the portal
+    reloads the dependent controls. Returns the number of field changes avoided.
+    """
+    pacer = pacer or _default_pacer()
+    form = {} if form is None else form
+    avoided = 0
+
+    async def set_field(name: str, action: Callable[[], Awaitable]) -> None:
+        nonlocal avoided
+        value = case[name]
+        if form.get(name) == value:
+            avoided += 1
+            return
+        await action()
+        form[name] = value
+        await pacer.step(page)
+
+    async def select_book() -> None:
+        await page.click("#progTipoCausa")
+        await page.select_option("#progTipoCausa", case["book"])
+
+    if form.get("competency") != case["competency"]:
+        form.clear()
+    elif case["competency"] == "Corte Apelaciones" and form.get("court") != case["court"]:
+        form.pop("book", None)
+    await set_field("competency", lambda: page.select_option("#progComp", case["competency"]))
     if case["competency"] == "Corte Apelaciones":
-        await page.wait_for_selector('//*[@id="progCorte"]')
-        await page.select_option('//*[@id="progCorte"]', case["court"])
-        await page.mouse.move(random.random() * 800, random.random() * 800)
-    await page.wait_for_selector('//*[@id="progRolCausa"]')
-    await page.fill('//*[@id="progRolCausa"]', case["rol"])
-    await page.mouse.move(random.random() * 800, random.random() * 800)
-    await page.wait_for_selector('//*[@id="progEraCausa"]')
-    await page.fill('//*[@id="progEraCausa"]', case["year"])
-    await page.mouse.move(random.random() * 800, random.random() * 800)
+        await set_field("court", lambda: page.select_option("#progCorte", case["court"]))
+    await set_field("rol", lambda: page.fill("#progRolCausa", case["rol"]))
+    await set_field("year", lambda: page.fill("#progEraCausa", case["year"]))
     if case["competency"] == "Corte Apelaciones":
-        await page.wait_for_selector('//*[@id="progTipoCausa"]')
-        await page.click('//*[@id="progTipoCausa"]')
-        await page.select_option('//*[@id="progTipoCausa"]', case["book"])
-        await page.mouse.move(random.random() * 800, random.random() * 800)
-    await page.wait_for_selector('//*[@id="btnProgConsulta"]')
-    await page.click('//*[@id="btnProgConsulta"]')
-    await page.mouse.move(random.random() * 800, random.random() * 800)
-
-
-async def playwright_get_courtroom_schedule(page: Page):
-    await page.wait_for_selector('//*[@id="dtaTableDetalleProgSala"]')
-    table_locator = page.locator('//*[@id="dtaTableDetalleProgSala"]')
+        await set_field("book", select_book)
+    await page.evaluate(_MARK_STALE_ROWS_JS, _RESULTS_TABLE_ID)
+
+    async def click() -> None:
+        await page.click("#btnProgConsulta")
+
+    await (click() if submit is None else submit(click))
+    await pacer.step(page)
+    return avoided
+
+
+# Serialize the whole results table in one CDP round-trip. When DataTables paginates
+# the table, body rows are read from its API so every page is included.
+_EXTRACT_TABLE_JS = """
+(tableId) => {
+  const table = document.getElementById(tableId);
+  if (!table) return null;
+  const cells = (tr) => Array.from(tr.querySelectorAll("td")).map((td) => td.innerText);
+  const domRows = Array.from(table.querySelectorAll("tr"));
+  const $ = window.jQuery;
+  if ($ && $.fn && $.fn.dataTable && $.fn.dataTable.isDataTable(table)) {
+    const bodyRows = $(table).DataTable().rows({ order: "applied", search: "applied" }).nodes().toArray();
+    if (bodyRows.length) {
+      const headRows = domRows.filter((tr) => !tr.closest("tbody"));
+      return headRows.concat(bodyRows).map(cells);
+    }
+  }
+  return domRows.map(cells);
+}
+"""
+
+
+async def _get_courtroom_schedule_per_cell(page: Page, counters: dict) -> list[list[str]]:
+    table_locator = page.locator(f"#{_RESULTS_TABLE_ID}")
     row_locators = await table_locator.locator("tr").all()
+    counters["round_trips"] += 1
     rows = []
     for index, row_locator in enumerate(row_locators):
         cells = await row_locator.locator("td").all()
         row = [await cell.inner_text() for cell in cells]
+        counters["round_trips"] += 1 + len(cells)
         rows.append(row)
     return rows
 
 
+@timed("table_extract")
+async def playwright_get_courtroom_schedule(
+    page: Page,
+    *,
+    extraction: str = "bulk",
+    stats: ScrapeStats | None = None,
+):
+    """
+    Read every row of dtaTableDetalleProgSala as a list of cell texts.
+
+    extraction="bulk" uses a single `page.evaluate`; extraction="cells" keeps the
+    original locator-per-cell path. Both return the same rows; `stats` records the
+    CDP round-trips made next to what the per-cell path would have needed.
+
+    Waits until the table body holds rows of the last consulta (none flagged stale).
+    The check re-runs on DOM mutations rather than on a timer, so it returns as soon
+    as the response is rendered and never reads the previous case's rows; a captcha,
+    dialog or error page raises `PageStateError` right away instead of timing out.
+    """
+    await wait_for_page_state(page, _RESULTS_TABLE_ID, RESULTS)
+    counters = {"round_trips": 0}
+    if extraction == "cells":
+        rows = await _get_courtroom_schedule_per_cell(page, counters)
+    else:
+        rows = await page.evaluate(_EXTRACT_TABLE_JS, _RESULTS_TABLE_ID) or []
+        counters["round_trips"] += 1
+    if stats is not None:
+        stats.extraction_round_trips += counters["round_trips"]
+        # Per-cell equivalent: one call for the rows, one per row for its cells, one per cell.
+        stats.extraction_round_trips_per_cell += 1 + sum(1 + len(row) for row in rows)
+    return rows
+
+
 class Case(BaseModel):
     competency: str
     rol: str
@@ -130,44 +326,335 @@ class Cases(BaseModel):
     cases: list[Case]
 
 
-async def playwright_start_process(cases: Cases, headless: bool = True, cdp_url: str | None = None):
-    schedule_results: list[list[list[str]]] = []
+SCRAPE_ERROR_MESSAGE = "Error al obtener el horario de la sala"
+
+# Called with (index in `cases`, result record) as soon as each case finishes.
+ResultCallback = Callable[[int, ScheduleResult], Awaitable[None]]
 
-    # Allow env var configuration (useful inside docker-compose)
-    if not cdp_url:
-        cdp_url = os.getenv("PLAYWRIGHT_CDP_URL")
 
-    # NOTE: playwright-stealth wraps Playwright internals and can interfere with CDP connections.
-    # We only enable stealth for the local-launch path.
-    cm = async_playwright() if cdp_url else Stealth().use_async(async_playwright())
+def _case_fields(case) -> dict:
+    # Incoming cases are dicts from the API body; keep a tolerant fallback.
+    case_dict = case.get("json") if isinstance(case, dict) else None
+    return case_dict or case
 
-    async with cm as p:
-        browser, page, is_cdp = await _init_browser_and_page(p, headless=headless, cdp_url=cdp_url)
+
+async def _scrape_case(
+    page: Page,
+    case: dict,
+    direct: DirectScheduleClient | None,
+    *,
+    pacer: Pacer,
+    extraction: str,
+    stats: ScrapeStats,
+    form: dict[str, str] | None = None,
+) -> Schedule | NoData:
+    """
+    Fast path: replay the consulta request over HTTP. Falls back to driving the form
+    (and captures the request for the next cases) when no replay is possible.
+    `form` tracks the page's form values across cases (see
+    `playwright_find_courtroom_schedule`).
+    """
+    if direct is not None and direct.can_replay(case):
+        await pacer.pause()
+        rows = await direct.fetch(case)
+        if rows is not None:
+            return schedule_from_rows(rows)
+        # The portal (or the connection) rejected the replay: slow every page down.
+        pacer.controller.failure()
+
+    async def capture(click: Callable[[], Awaitable]) -> None:
         try:
-            await playwright_goto_courtroom_schedule_page(page)
-            print("Pagina cargada")
-            for case in cases:
-                # Incoming cases are dicts from the API body; keep a tolerant fallback.
-                case_dict = case.get("json") if isinstance(case, dict) else None
-                if not case_dict:
-                    case_dict = case
-
-                print("\n" + "-" * 20)
-                print(f"Iniciando proceso para {case_dict}")
-
-                await playwright_find_courtroom_schedule(page, case_dict)
-                schedule = await playwright_get_courtroom_schedule(page)
-                schedule_results.append(schedule[2:])
-                print(f"Proceso para {case_dict} finalizado")
-        except Exception:
-            await _dump_debug(page, "flow_timeout")
-            raise Exception("Error al obtener el horario de la sala")
-        finally:
-            await page.close()
-            # If connected to host Brave via CDP, do not close the host browser.
-            if not is_cdp:
+            await direct.capture(page, click, case)
+        except PlaywrightTimeoutError:
+            # The click happened but no XHR was seen; keep using the DOM path only.
+            pass
+
+    stats.form_changes_avoided += await playwright_find_courtroom_schedule(
+        page,
+        case,
+        pacer,
+        form=form,
+        submit=capture if direct is not None and not direct.ready and direct.enabled else None,
+    )
+    schedule = await playwright_get_courtroom_schedule(page, extraction=extraction, stats=stats)
+    # The first two rows are the table headers.
+    return schedule_from_rows(schedule[2:])
+
+
+async def _scrape_worker(
+    pool: "BrowserPool | ShardedBrowserPool",
+    queue: asyncio.Queue,
+    schedule_results: list,
+    direct: DirectScheduleClient | None,
+    *,
+    pacer: Pacer,
+    extraction: str,
+    retries: int,
+    captcha_wait: float,
+    stats: ScrapeStats,
+    on_result: ResultCallback | None,
+) -> None:
+    """
+    Lease a page from the pool once the first case arrives (navigating to Programación
+    de Sala only if it is not already parked there) and drain cases from the queue until
+    the None sentinel. Results are written at the original index so callers can zip
+    them back.
+
+    Each case is isolated: a failure classifies the page (see `app.page_state`) and
+    recovers accordingly before retrying the same case up to `retries` times: a dialog
+    is dismissed, an expired session or unexpected page is reloaded, maintenance pauses
+    every page with backoff, and a captcha waits up to `captcha_wait` seconds for a
+    human in CDP mode or moves on to a page in a fresh browser context otherwise. After
+    that the case gets a `ScheduleError`, debug artifacts named after the state are
+    dumped, and the worker moves on to the next one. If the page itself is gone (browser disconnected), the
+    lease is returned and a new page is leased for the remaining attempts, possibly
+    from another browser of a sharded pool.
+    """
+    item = await queue.get()
+    attempt = 0
+    while item is not None:
+        async with pool.lease() as pooled:
+            page = pooled.page
+            while item is not None:
+                index, case = item
+                case_dict = _case_fields(case)
+                if attempt == 0:
+                    print("\n" + "-" * 20)
+                    print(f"Iniciando proceso para {case_dict}")
+                    started = time.perf_counter()
+                    paced_before = pacer.pacing_seconds
+
                 try:
-                    await browser.close()
-                except Exception:
-                    pass
+                    if attempt:
+                        # Honour the backoff / captcha hold before touching the portal again.
+                        await pacer.pause()
+                    if not pooled.warm:
+                        await playwright_goto_courtroom_schedule_page(page, pacer)
+                        pooled.form.clear()
+                        pooled.warm = True
+                        print("Pagina cargada")
+                    result = await _scrape_case(
+                        page,
+                        case_dict,
+                        direct,
+                        pacer=pacer,
+                        extraction=extraction,
+                        stats=stats,
+                        form=pooled.form,
+                    )
+                    pacer.controller.success()
+                    print(f"Proceso para {case_dict} finalizado")
+                except Exception as e:
+                    state = (
+                        e.state
+                        if isinstance(e, PageStateError)
+                        else await detect_page_state(page, _RESULTS_TABLE_ID)
+                    )
+                    action = recovery_for(state, cdp=pooled.cdp)
+                    stats.page_states[state] = stats.page_states.get(state, 0) + 1
+                    stats.recoveries[action] = stats.recoveries.get(action, 0) + 1
+                    print(f"Página en estado '{state}' para {case_dict}, recuperación: {action}")
+                    pacer.controller.failure(captcha=state == CAPTCHA)
+                    result = ScheduleError(f"{SCRAPE_ERROR_MESSAGE}: {e}")
+                    if action == DISMISS:
+                        # The form behind the dialog is still usable.
+                        await dismiss_modal(page)
+                    else:
+                        pooled.warm = False
+                        pooled.errors += 1
+                    if action == BACKOFF:
+                        pacer.controller.hold(pacer.controller.profile.captcha_pause * 2**attempt)
+                    elif action == HUMAN and attempt < retries:
+                        print(
+                            f"Captcha en el navegador: resuélvelo a mano para continuar "
+                            f"(esperando hasta {captcha_wait:.0f} s)"
+                        )
+                        if await wait_for_human(page, _RESULTS_TABLE_ID, timeout=captcha_wait):
+                            print("Captcha resuelto, continuando")
+                    if attempt < retries:
+                        attempt += 1
+                        stats.retries += 1
+                        print(f"Reintentando {case_dict} ({attempt}/{retries}): {e}")
+                        if action == ROTATE:
+                            # The pool swaps the flagged browser context when the lease ends.
+                            pooled.rotate = True
+                        if action == ROTATE or page.is_closed():
+                            break  # lease a fresh page for the next attempt
+                        continue
+                    # Only the final failure of a case is worth the screenshot and HTML.
+                    await _dump_debug(page, state)
+                    stats.failed_cases += 1
+                    print(f"Proceso para {case_dict} falló: {result.message}")
+
+                attempt = 0
+                paced = pacer.pacing_seconds - paced_before
+                stats.pacing_seconds += paced
+                stats.network_seconds += time.perf_counter() - started - paced
+                schedule_results[index] = result
+                if on_result is not None:
+                    await on_result(index, result)
+                item = await queue.get()
+
+
+def _form_group(case) -> tuple[str, str, str]:
+    """(competency, court, book): the form selects a case needs, used to order a batch."""
+    case_fields = _case_fields(case)
+    if not isinstance(case_fields, dict):
+        case_fields = dict(case_fields)  # pydantic Case
+    return case_key(case_fields)[:3]
+
+
+async def _feed_cases(
+    cases: "Cases | AsyncIterable[dict]",
+    queue: asyncio.Queue,
+    schedule_results: list,
+    *,
+    workers: int,
+    plan_window: int = 0,
+) -> None:
+    """
+    Push (index, case) items to the workers, then one None sentinel per worker.
+
+    With `plan_window`, every `plan_window` cases (the whole batch for a list) are
+    ordered by (competency, court, book) before being queued, so consecutive cases
+    on a page keep the same selects. Indices follow the input order, so results
+    still come back in the caller's order.
+    """
+    pending: list[tuple[int, object]] = []
+
+    async def flush() -> None:
+        pending.sort(key=lambda item: _form_group(item[1]))
+        for item in pending:
+            await queue.put(item)
+        pending.clear()
+
+    async def put(case) -> None:
+        schedule_results.append(None)
+        item = (len(schedule_results) - 1, case)
+        if plan_window <= 0:
+            await queue.put(item)
+            return
+        pending.append(item)
+        if len(pending) >= plan_window:
+            await flush()
+
+    if isinstance(cases, AsyncIterable):
+        async for case in cases:
+            await put(case)
+    else:
+        if plan_window > 0:
+            plan_window = max(plan_window, len(cases))
+        for case in cases:
+            await put(case)
+    await flush()
+    for _ in range(workers):
+        await queue.put(None)
+
+
+async def playwright_start_process(
+    cases: "Cases | AsyncIterable[dict]",
+    headless: bool = True,
+    cdp_url: str | None = None,
+    *,
+    pool: "BrowserPool | ShardedBrowserPool | None" = None,
+    concurrency: int = 1,
+    direct_fetch: bool = False,
+    extraction: str = "bulk",
+    pacing: PacingProfile = PACING_PROFILES["stealth"],
+    retries: int = 2,
+    captcha_wait: float = 120.0,
+    plan_window: int = 100,
+    stats: ScrapeStats | None = None,
+    on_result: ResultCallback | None = None,
+):
+    """
+    Scrape every case with a bounded pool of `concurrency` pages.
+    Pages are leased from `pool` (kept warm across jobs); without one, a temporary
+    pool is opened for this call from `headless`/`cdp_url` and closed afterwards.
+
+    With `direct_fetch`, the consulta request is replayed over HTTP after the first
+    DOM-driven case (see `DirectScheduleClient`). Delays between steps follow the
+    adaptive `pacing` profile shared by every page. `on_result` is awaited with
+    each case's result as soon as it finishes (used for checkpointing).
+
+    `cases` may also be an async iterable (e.g. rows streamed from an upload): scraping
+    starts with the first window of cases, and the page lease waits until a case is
+    available. Cases are scraped grouped by (competency, court, book) within windows of
+    `plan_window` cases (0 keeps the input order), so unchanged form fields are not
+    sent again; `stats.form_changes_avoided` counts the skipped field changes.
+
+    The returned list keeps the same order as `cases`, with one record per case
+    (`Schedule`, `NoData`, or `ScheduleError` for a case that still fails after
+    `retries` retries).
+    """
+    # Imported here: app.browser_pool builds on the helpers of this module.
+    from app.browser_pool import BrowserPool
+
+    schedule_results: list[ScheduleResult | None] = []
+    if not isinstance(cases, AsyncIterable):
+        if not cases:
+            return schedule_results
+        concurrency = min(concurrency, len(cases))
+
+    owns_pool = pool is None
+    if pool is None:
+        # Allow env var configuration (useful inside docker-compose)
+        if not cdp_url:
+            cdp_url = os.getenv("PLAYWRIGHT_CDP_URL")
+        pool = BrowserPool(
+            cdp_url=cdp_url, headless=headless, size=concurrency, max_uses=0, pacing=pacing
+        )
+
+    concurrency = max(1, min(concurrency, pool.size))
+    # Bounded so a streamed source is only read as fast as it is scraped.
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    direct = DirectScheduleClient(max_connections=concurrency) if direct_fetch else None
+    if stats is None:
+        stats = ScrapeStats()
+    stats.pacing_profile = pacing.name
+    pacing_controller = PacingController(pacing)
+
+    started = time.perf_counter()
+    feeder = asyncio.create_task(
+        _feed_cases(
+            cases, queue, schedule_results, workers=concurrency, plan_window=plan_window
+        )
+    )
+    workers = [
+        asyncio.create_task(
+            _scrape_worker(
+                pool,
+                queue,
+                schedule_results,
+                direct,
+                pacer=pacing_controller.pacer(),
+                extraction=extraction,
+                retries=retries,
+                captcha_wait=captcha_wait,
+                stats=stats,
+                on_result=on_result,
+            )
+        )
+        for _ in range(concurrency)
+    ]
+    try:
+        await asyncio.gather(feeder, *workers)
+    except Exception as e:
+        for task in (feeder, *workers):
+            task.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)
+        raise Exception(f"{SCRAPE_ERROR_MESSAGE}: {e}") from e
+    finally:
+        if direct is not None:
+            await direct.aclose()
+        if owns_pool:
+            await pool.close()
+
+    stats.cases = len(schedule_results)
+    stats.concurrency = concurrency
+    stats.elapsed_seconds = time.perf_counter() - started
+    if direct is not None:
+        stats.direct_fetch_hits = direct.hits
+        stats.direct_fetch_fallbacks = direct.fallbacks
     return schedule_results
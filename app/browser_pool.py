@@ -0,0 +1,492 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from playwright.async_api import async_playwright, Page
+from playwright_stealth import Stealth
+
+from app.automatization import (
+    _init_browser_and_page,
+    new_browser_context,
+    playwright_goto_courtroom_schedule_page,
+)
+from app.pacing import PACING_PROFILES, PacingController, PacingProfile
+from app.page_state import install_modal_handler
+
+
+@dataclass
+class PooledPage:
+    page: Page
+    generation: int
+    # True while the page is parked on the Programación de Sala form.
+    warm: bool = False
+    uses: int = 0
+    errors: int = 0
+    # Values currently in the form (case field -> value), to skip unchanged fields.
+    form: dict[str, str] = field(default_factory=dict)
+    # Page of the host browser (CDP): a person can solve a captcha on it.
+    cdp: bool = False
+    # Set when the portal flagged this page's context (captcha): replaced on release.
+    rotate: bool = False
+
+
+class BrowserPool:
+    """
+    Long-lived browser (CDP host browser or local Chromium) with up to `size` pages.
+
+    Pages are warmed once (navigated to Programación de Sala) and leased to jobs with
+    `lease()`. Each lease health-checks the page; pages are recycled after `max_uses`
+    leases (0 = never) or after a lease that saw errors, and the whole browser is
+    reconnected if it disconnects. A page marked `rotate` moves every later page to a
+    new browser context, so a flagged session's cookies are not reused.
+    """
+
+    def __init__(
+        self,
+        *,
+        cdp_url: str | None = None,
+        headless: bool = True,
+        size: int = 1,
+        max_uses: int = 50,
+        pacing: PacingProfile = PACING_PROFILES["stealth"],
+    ) -> None:
+        self.cdp_url = cdp_url
+        self.headless = headless
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.pacing = pacing
+        self.stats = {"leases": 0, "warm_leases": 0, "created": 0, "recycled": 0, "reconnects": 0, "rotations": 0}
+        self.browser = None
+        self.is_cdp = False
+        self._playwright_cm = None
+        self._context = None
+        # False for the host browser's own context (CDP), which must never be closed.
+        self._owns_context = False
+        self._generation = 0
+        self._created = 0
+        self._idle: asyncio.Queue[PooledPage] = asyncio.Queue()
+        # One slot per page: a lease holding a slot always finds an idle page or room to
+        # open one, including after another lease's page was recycled.
+        self._slots = asyncio.Semaphore(self.size)
+        self._lock = asyncio.Lock()
+        self._launch: asyncio.Task | None = None
+        self._warm_task: asyncio.Task | None = None
+
+    async def _ensure_browser(self) -> None:
+        async with self._lock:
+            if self.browser is not None and self.browser.is_connected():
+                return
+            if self._launch is None:
+                if self.browser is not None:
+                    self.stats["reconnects"] += 1
+                    await self._close_browser()
+                self._launch = asyncio.create_task(self._launch_browser())
+            launch = self._launch
+        # Every lease waits on the same launch; shielded so that a cancelled lease (e.g.
+        # the other workers when the first launch fails) never interrupts the driver start.
+        try:
+            await asyncio.shield(launch)
+        finally:
+            if launch.done() and self._launch is launch:
+                self._launch = None
+
+    async def _launch_browser(self) -> None:
+        # NOTE: playwright-stealth wraps Playwright internals and can interfere with CDP
+        # connections. We only enable stealth for the local-launch path.
+        cm = async_playwright() if self.cdp_url else Stealth().use_async(async_playwright())
+        try:
+            p = await cm.__aenter__()
+            self.browser, page, self.is_cdp = await _init_browser_and_page(
+                p, headless=self.headless, cdp_url=self.cdp_url
+            )
+        except BaseException:
+            # Also stops a driver that failed halfway through starting.
+            try:
+                await cm.__aexit__(None, None, None)
+            except Exception:
+                pass
+            self.browser = None
+            raise
+        self._playwright_cm = cm
+        self._context = page.context
+        self._owns_context = not self.is_cdp
+        self._generation += 1
+        self._created = 1
+        self.stats["created"] += 1
+        await install_modal_handler(page)
+        self._idle.put_nowait(PooledPage(page, self._generation, cdp=self.is_cdp))
+
+    async def _rotate_context(self, pooled: PooledPage) -> None:
+        async with self._lock:
+            # Several pages of the same context may be flagged; rotate once.
+            if pooled.generation != self._generation or self.browser is None:
+                return
+            old, owned = self._context, self._owns_context
+            self._context = await new_browser_context(self.browser)
+            self._owns_context = True
+            self._generation += 1
+            self._created = 0
+            self.stats["rotations"] += 1
+            while not self._idle.empty():
+                try:
+                    await self._idle.get_nowait().page.close()
+                except Exception:
+                    pass
+            # Pages of the old context still leased fail and are re-leased from the new one.
+            if owned:
+                try:
+                    await old.close()
+                except Exception:
+                    pass
+
+    async def _new_page(self) -> PooledPage:
+        self._created += 1
+        try:
+            page = await self._context.new_page()
+            await install_modal_handler(page)
+        except BaseException:
+            self._created -= 1
+            raise
+        self.stats["created"] += 1
+        return PooledPage(page, self._generation, cdp=self.is_cdp)
+
+    async def _discard(self, pooled: PooledPage) -> None:
+        if pooled.generation == self._generation:
+            self._created -= 1
+        try:
+            await pooled.page.close()
+        except Exception:
+            pass
+
+    async def _healthy(self, pooled: PooledPage) -> bool:
+        if pooled.generation != self._generation or pooled.page.is_closed():
+            return False
+        if pooled.warm:
+            try:
+                pooled.warm = await pooled.page.locator("#progComp").count() > 0
+            except Exception:
+                return False
+        return True
+
+    async def _warm(self, pooled: PooledPage) -> None:
+        await playwright_goto_courtroom_schedule_page(
+            pooled.page, PacingController(self.pacing).pacer()
+        )
+        pooled.form.clear()
+        pooled.warm = True
+
+    async def _acquire(self) -> PooledPage:
+        while True:
+            await self._ensure_browser()
+            if self._idle.empty() and self._created < self.size:
+                pooled = await self._new_page()
+            else:
+                pooled = await self._idle.get()
+            if await self._healthy(pooled):
+                return pooled
+            await self._discard(pooled)
+
+    async def _release(self, pooled: PooledPage) -> None:
+        pooled.uses += 1
+        if pooled.rotate:
+            try:
+                await self._rotate_context(pooled)
+            except Exception as e:
+                print(f"No se pudo renovar el contexto del navegador: {e}")
+        if (
+            pooled.errors
+            or (self.max_uses and pooled.uses >= self.max_uses)
+            or not await self._healthy(pooled)
+        ):
+            self.stats["recycled"] += 1
+            await self._discard(pooled)
+            return
+        self._idle.put_nowait(pooled)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[PooledPage]:
+        async with self._slots:
+            pooled = await self._acquire()
+            pooled.errors = 0
+            self.stats["leases"] += 1
+            if pooled.warm:
+                self.stats["warm_leases"] += 1
+            try:
+                yield pooled
+            finally:
+                await self._release(pooled)
+
+    async def warm_up(self) -> None:
+        """Open and park every page on the Programación de Sala screen."""
+        await self._ensure_browser()
+        pages = []
+        while not self._idle.empty():
+            pages.append(self._idle.get_nowait())
+        while self._created < self.size:
+            pages.append(await self._new_page())
+        try:
+            await asyncio.gather(
+                *(self._warm(pooled) for pooled in pages if not pooled.warm),
+                return_exceptions=True,
+            )
+        finally:
+            for pooled in pages:
+                self._idle.put_nowait(pooled)
+
+    def start(self) -> None:
+        """Warm the pool in the background (the host browser may not be up yet)."""
+
+        async def warm() -> None:
+            try:
+                await self.warm_up()
+                print(f"Pool de navegador listo ({self.size} páginas)")
+            except Exception as e:
+                print(f"No se pudo precalentar el pool de navegador: {e}")
+
+        self._warm_task = asyncio.create_task(warm())
+
+    async def ping(self) -> bool:
+        """Connect (or reconnect) the browser; raises if the endpoint is unreachable."""
+        await self._ensure_browser()
+        return self.browser.is_connected()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "size": self.size, "open_pages": self._created, "idle": self._idle.qsize()}
+
+    async def _close_browser(self) -> None:
+        while not self._idle.empty():
+            pooled = self._idle.get_nowait()
+            try:
+                await pooled.page.close()
+            except Exception:
+                pass
+        # If connected to host Brave via CDP, do not close the host browser.
+        if self.is_cdp and self._owns_context and self._context is not None:
+            try:
+                await self._context.close()
+            except Exception:
+                pass
+        if self.browser is not None and not self.is_cdp:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        if self._playwright_cm is not None:
+            try:
+                await self._playwright_cm.__aexit__(None, None, None)
+            except Exception:
+                pass
+        self.browser = None
+        self._context = None
+        self._playwright_cm = None
+        self._created = 0
+
+    async def close(self) -> None:
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            await asyncio.gather(self._warm_task, return_exceptions=True)
+            self._warm_task = None
+        if self._launch is not None:
+            # Let a launch in progress finish (or fail) before tearing it down.
+            await asyncio.gather(self._launch, return_exceptions=True)
+            self._launch = None
+        async with self._lock:
+            await self._close_browser()
+
+
+@dataclass
+class Shard:
+    pool: BrowserPool
+    # Leases currently out, used to spread pages across browsers.
+    active: int = 0
+    down_until: float = 0.0
+    last_error: str | None = None
+
+    @property
+    def endpoint(self) -> str:
+        return self.pool.cdp_url or "local"
+
+
+def parse_shards(spec: str, *, default_size: int = 1) -> list[tuple[str | None, int]]:
+    """
+    "http://10.0.0.2:9223=3, http://10.0.0.3:9223, local=2" -> [(url, size), ...].
+    `local` launches a headless Chromium in this container; the size is the maximum
+    number of pages (concurrent cases) for that browser.
+    """
+    shards = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        endpoint, _, size = entry.rpartition("=") if "=" in entry else (entry, "", "")
+        shards.append(
+            (None if endpoint == "local" else endpoint, int(size) if size else default_size)
+        )
+    return shards
+
+
+class ShardedBrowserPool:
+    """
+    Several `BrowserPool`s (CDP endpoints and/or local launches) behind one `lease()`.
+
+    Each lease goes to the reachable shard with the lowest load (active leases / size),
+    so each shard never holds more than its own `size` pages; when every shard is full
+    the lease waits for a page to be returned. A shard that fails to
+    connect is skipped for `cooldown` seconds (the lease fails over to the next one)
+    and re-checked in the background; a shard whose browser disconnects mid-job is
+    reconnected by its own pool.
+    """
+
+    def __init__(
+        self,
+        shards: list[tuple[str | None, int]],
+        *,
+        max_uses: int = 50,
+        pacing: PacingProfile = PACING_PROFILES["stealth"],
+        cooldown: float = 30.0,
+    ) -> None:
+        if not shards:
+            raise ValueError("At least one browser shard is required")
+        self.shards = [
+            Shard(
+                BrowserPool(
+                    cdp_url=cdp_url,
+                    headless=True,  # ignored when using CDP
+                    size=size,
+                    max_uses=max_uses,
+                    pacing=pacing,
+                )
+            )
+            for cdp_url, size in shards
+        ]
+        self.cooldown = cooldown
+        self.stats = {"failovers": 0}
+        self._freed = asyncio.Condition()
+        self._warm_task: asyncio.Task | None = None
+        self._health_task: asyncio.Task | None = None
+
+    @property
+    def size(self) -> int:
+        return sum(shard.pool.size for shard in self.shards)
+
+    def _candidates(self) -> list[Shard]:
+        now = time.monotonic()
+        up = [shard for shard in self.shards if shard.down_until <= now]
+        # If every shard is cooling down, still try them (best chance first).
+        ordered = up or sorted(self.shards, key=lambda shard: shard.down_until)
+        return sorted(ordered, key=lambda shard: shard.active / shard.pool.size)
+
+    def _mark_down(self, shard: Shard, error: Exception) -> None:
+        shard.down_until = time.monotonic() + self.cooldown
+        shard.last_error = str(error)
+        self.stats["failovers"] += 1
+        print(f"Navegador {shard.endpoint} no disponible: {error}")
+
+    async def _reserve(self, tried: list[Shard]) -> Shard | None:
+        """
+        Take a page slot on the least loaded candidate not in `tried`, waiting while they
+        are all full. Reserved before the (slow) lease so concurrent leases spread out.
+        """
+        async with self._freed:
+            while True:
+                shards = [shard for shard in self._candidates() if shard not in tried]
+                if not shards:
+                    return None
+                if shards[0].active < shards[0].pool.size:
+                    shards[0].active += 1
+                    return shards[0]
+                await self._freed.wait()
+
+    async def _unreserve(self, shard: Shard) -> None:
+        shard.active -= 1
+        async with self._freed:
+            self._freed.notify()
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[PooledPage]:
+        async with AsyncExitStack() as stack:
+            tried: list[Shard] = []
+            error: Exception | None = None
+            while True:
+                shard = await self._reserve(tried)
+                if shard is None:
+                    raise RuntimeError(f"No hay navegadores disponibles: {error}")
+                tried.append(shard)
+                try:
+                    pooled = await stack.enter_async_context(shard.pool.lease())
+                except BaseException as e:
+                    await self._unreserve(shard)
+                    if not isinstance(e, Exception):
+                        raise
+                    self._mark_down(shard, e)
+                    error = e
+                    continue
+                break
+            shard.down_until = 0.0
+            try:
+                yield pooled
+            finally:
+                await self._unreserve(shard)
+
+    async def warm_up(self) -> None:
+        results = await asyncio.gather(
+            *(shard.pool.warm_up() for shard in self.shards), return_exceptions=True
+        )
+        for shard, result in zip(self.shards, results):
+            if isinstance(result, Exception):
+                self._mark_down(shard, result)
+
+    async def _health_check(self) -> None:
+        while True:
+            await asyncio.sleep(self.cooldown)
+            for shard in self.shards:
+                if shard.down_until == 0.0:
+                    continue
+                try:
+                    await shard.pool.ping()
+                except Exception as e:
+                    shard.down_until = time.monotonic() + self.cooldown
+                    shard.last_error = str(e)
+                else:
+                    shard.down_until = 0.0
+                    print(f"Navegador {shard.endpoint} disponible nuevamente")
+
+    def start(self) -> None:
+        """Warm every shard in the background and keep re-checking the unreachable ones."""
+
+        async def warm() -> None:
+            await self.warm_up()
+            up = sum(1 for shard in self.shards if shard.down_until == 0.0)
+            print(
+                f"Pool de navegadores listo ({up}/{len(self.shards)} navegadores, "
+                f"{self.size} páginas)"
+            )
+
+        self._warm_task = asyncio.create_task(warm())
+        self._health_task = asyncio.create_task(self._health_check())
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "size": self.size,
+            "shards": [
+                {
+                    "endpoint": shard.endpoint,
+                    "healthy": shard.down_until <= now,
+                    "active": shard.active,
+                    "last_error": shard.last_error,
+                    **shard.pool.snapshot(),
+                }
+                for shard in self.shards
+            ],
+        }
+
+    async def close(self) -> None:
+        for task in (self._warm_task, self._health_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        await asyncio.gather(*(shard.pool.close() for shard in self.shards))
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Mapping
+
+from app.records import NoData, Schedule, schedule_from_rows, schedule_to_json
+
+CaseKey = tuple[str, str, str, str, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    case_key TEXT PRIMARY KEY,
+    rows TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+
+def case_key(case_fields: Mapping[str, Any]) -> CaseKey:
+    """(competency, court, book, rol, year) with surrounding whitespace removed."""
+    competency = str(case_fields.get("competency") or "").strip()
+    court = book = ""
+    if competency == "Corte Apelaciones":
+        # court/book only affect the query for Corte Apelaciones.
+        court = str(case_fields.get("court") or "").strip()
+        book = str(case_fields.get("book") or "").strip()
+    return (
+        competency,
+        court,
+        book,
+        str(case_fields.get("rol") or "").strip(),
+        str(case_fields.get("year") or "").strip(),
+    )
+
+
+class ScheduleCache:
+    """
+    SQLite cache of scraped schedules keyed by case identity (stored as the compact
+    portal rows, returned as `Schedule` / `NoData` records).
+
+    Entries older than `ttl_seconds` are treated as misses; once the table holds
+    more than `max_entries` rows the least recently used ones are evicted.
+    The async methods run the blocking sqlite calls off the event loop.
+    """
+
+    def __init__(self, path: str | Path, *, ttl_seconds: float, max_entries: int) -> None:
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._initialized = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        if not self._initialized:
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _get_many(self, keys: list[CaseKey]) -> dict[CaseKey, Schedule | NoData]:
+        now = time.time()
+        found: dict[CaseKey, Schedule | NoData] = {}
+        conn = self._connect()
+        try:
+            for key in set(keys):
+                row = conn.execute(
+                    "SELECT rows, fetched_at FROM schedules WHERE case_key = ?",
+                    (json.dumps(key),),
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl_seconds:
+                    continue
+                found[key] = schedule_from_rows(json.loads(row[0]))
+            conn.executemany(
+                "UPDATE schedules SET last_access = ? WHERE case_key = ?",
+                [(now, json.dumps(key)) for key in found],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return found
+
+    def _put_many(self, items: list[tuple[CaseKey, Schedule | NoData]]) -> None:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO schedules (case_key, rows, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (json.dumps(key), json.dumps(schedule_to_json(schedule)), now, now)
+                    for key, schedule in items
+                ],
+            )
+            conn.execute(
+                "DELETE FROM schedules WHERE fetched_at < ?", (now - self.ttl_seconds,)
+            )
+            conn.execute(
+                "DELETE FROM schedules WHERE case_key NOT IN ("
+                "SELECT case_key FROM schedules ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def get_many(self, keys: list[CaseKey]) -> dict[CaseKey, Schedule | NoData]:
+        if not self.enabled or not keys:
+            return {}
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def put_many(self, items: list[tuple[CaseKey, Schedule | NoData]]) -> None:
+        if not self.enabled or not items:
+            return
+        await asyncio.to_thread(self._put_many, items)
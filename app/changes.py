@@ -0,0 +1,147 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.cache import CaseKey
+from app.records import Hearing, NoData, Schedule, schedule_from_rows, schedule_to_json
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS last_schedules (
+    case_key TEXT PRIMARY KEY,
+    rows TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def _hearings(schedule: Schedule | NoData) -> tuple[Hearing, ...]:
+    # "No data" answers simply have no hearings.
+    return schedule.hearings if isinstance(schedule, Schedule) else ()
+
+
+@dataclass(slots=True)
+class ScheduleDiff:
+    """
+    Hearings that appeared, disappeared or were rescheduled since the last known run.
+    A hearing is identified by everything but its date (`Hearing.identity`).
+    """
+
+    added: list[Hearing] = field(default_factory=list)
+    removed: list[Hearing] = field(default_factory=list)
+    # (previous, current) pairs whose only difference is the date.
+    rescheduled: list[tuple[Hearing, Hearing]] = field(default_factory=list)
+    # True when there was no previous run to compare with.
+    first_seen: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.rescheduled)
+
+    def summary(self) -> dict[str, int]:
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "rescheduled": len(self.rescheduled),
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            "first_seen": self.first_seen,
+            "added": [h.as_dict() for h in self.added],
+            "removed": [h.as_dict() for h in self.removed],
+            "rescheduled": [
+                {"before": old.as_dict(), "after": new.as_dict()} for old, new in self.rescheduled
+            ],
+        }
+
+
+def diff_schedules(
+    previous: Schedule | NoData | None, current: Schedule | NoData
+) -> ScheduleDiff:
+    if previous is None:
+        return ScheduleDiff(added=list(_hearings(current)), first_seen=True)
+
+    # Identical hearings cancel out first (multiset difference).
+    remaining = defaultdict(list)
+    for hearing in _hearings(previous):
+        remaining[hearing].append(hearing)
+    new_hearings = []
+    for hearing in _hearings(current):
+        if remaining[hearing]:
+            remaining[hearing].pop()
+        else:
+            new_hearings.append(hearing)
+
+    # Leftovers sharing the same hearing identity were rescheduled.
+    old_by_identity = defaultdict(list)
+    for hearings in remaining.values():
+        for hearing in hearings:
+            old_by_identity[hearing.identity()].append(hearing)
+    result = ScheduleDiff()
+    for hearing in new_hearings:
+        candidates = old_by_identity.get(hearing.identity())
+        if candidates:
+            result.rescheduled.append((candidates.pop(0), hearing))
+        else:
+            result.added.append(hearing)
+    result.removed = [h for hearings in old_by_identity.values() for h in hearings]
+    return result
+
+
+class ScheduleHistory:
+    """
+    Last known schedule rows per case (SQLite), used to report what changed between
+    runs. Unlike `ScheduleCache` entries never expire: the previous run may be weeks old.
+    The async methods run the blocking sqlite calls off the event loop.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        if not self._initialized:
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _compare_and_store(
+        self, items: list[tuple[CaseKey, Schedule | NoData]]
+    ) -> list[ScheduleDiff]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            diffs = []
+            for key, schedule in items:
+                row = conn.execute(
+                    "SELECT rows FROM last_schedules WHERE case_key = ?", (json.dumps(key),)
+                ).fetchone()
+                previous = schedule_from_rows(json.loads(row[0])) if row else None
+                diffs.append(diff_schedules(previous, schedule))
+            conn.executemany(
+                "INSERT OR REPLACE INTO last_schedules (case_key, rows, updated_at) VALUES (?, ?, ?)",
+                [
+                    (json.dumps(key), json.dumps(schedule_to_json(schedule)), now)
+                    for key, schedule in items
+                ],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return diffs
+
+    async def compare_and_store(
+        self, items: list[tuple[CaseKey, Schedule | NoData]]
+    ) -> list[ScheduleDiff]:
+        """Diff each schedule against its last known rows, then remember the new rows."""
+        if not items:
+            return []
+        return await asyncio.to_thread(self._compare_and_store, items)
@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Hashable
+
+
+class InFlightCases:
+    """
+    App-wide registry of case keys currently being scraped.
+
+    The first job that needs a key becomes its owner and scrapes it; any later
+    occurrence (a duplicate row in the same job or the same case in a concurrent
+    job) awaits the owner's future instead of opening another browser query.
+    """
+
+    def __init__(self) -> None:
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        self.stats = {"owned": 0, "coalesced": 0}
+
+    def acquire(self, key: Hashable) -> tuple[asyncio.Future, bool]:
+        """Return the shared future for `key` and whether the caller must scrape it."""
+        future = self._futures.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return future, False
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        self.stats["owned"] += 1
+        return future, True
+
+    def resolve(self, key: Hashable, future: asyncio.Future, result: Any) -> None:
+        """Publish the owner's result and drop the key, so later jobs scrape (or hit the cache) again."""
+        if self._futures.get(key) is future:
+            del self._futures[key]
+        if not future.done():
+            future.set_result(result)
+
+    def snapshot(self) -> dict[str, int]:
+        return {**self.stats, "in_flight": len(self._futures)}
@@ -0,0 +1,290 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+from playwright.async_api import Page, Request
+
+from app.records import HEARING_COLUMNS, NO_DATA_MARKER, normalize_cell
+
+_NO_DATA_MESSAGE = "Ningún dato disponible en esta tabla"
+
+# Form controls behind btnProgConsulta and the case field each one carries.
+_FORM_FIELDS = {
+    "progComp": "competency",
+    "progCorte": "court",
+    "progRolCausa": "rol",
+    "progEraCausa": "year",
+    "progTipoCausa": "book",
+}
+_SELECT_FIELDS = ("progComp", "progCorte", "progTipoCausa")
+
+# Headers that httpx must compute itself (or that come from the cookie jar).
+_SKIPPED_HEADERS = {"cookie", "content-length", "host", "connection", "accept-encoding"}
+
+_READ_FORM_JS = """
+(ids) => {
+  const out = {values: {}, options: {}};
+  for (const id of ids) {
+    const el = document.getElementById(id);
+    if (!el) continue;
+    out.values[id] = el.value;
+    if (el.tagName === "SELECT") {
+      out.options[id] = Array.from(el.options).map(o => [o.textContent.trim(), o.value]);
+    }
+  }
+  return out;
+}
+"""
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _TableRowsParser(HTMLParser):
+    """
+    Collect <td> text per <tr>, like `playwright_get_courtroom_schedule` does in the DOM.
+    Only rows of the first dtaTableDetalleProgSala table are kept when the fragment has one.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.rows: list[list[str]] = []
+        self.found_table = False
+        self._table_depth = 0
+        self._in_target = False
+        self._row: list[str] | None = None
+        self._cell: list[str] | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self._table_depth += 1
+            if not self.found_table and dict(attrs).get("id") == "dtaTableDetalleProgSala":
+                self.found_table = True
+                self._in_target = True
+                self.rows = []
+        elif tag == "tr":
+            self._row = []
+        elif tag == "td" and self._row is not None:
+            self._cell = []
+        elif tag == "br" and self._cell is not None:
+            self._cell.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "td" and self._cell is not None and self._row is not None:
+            self._row.append(normalize_cell("".join(self._cell)))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            # Header rows (only <th>) carry no data; the DOM path drops them by slicing.
+            if self._row and (self._in_target or not self.found_table):
+                self.rows.append(self._row)
+            self._row = None
+        elif tag == "table":
+            self._table_depth -= 1
+            if self._in_target and self._table_depth == 0:
+                self._in_target = False
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            # Like innerText: whitespace in the markup is a space, only <br> breaks lines.
+            self._cell.append(_WHITESPACE.sub(" ", data))
+
+
+def parse_schedule_html(html: str) -> list[list[str]] | None:
+    """
+    Parse the HTML fragment returned by the consulta request into the same
+    `list[list[str]]` shape the Playwright path returns (header rows removed).
+    Returns None when the fragment does not look like a schedule table.
+    """
+    parser = _TableRowsParser()
+    parser.feed(html)
+    parser.close()
+    if parser.found_table:
+        # DataTables renders this message client-side when the tbody is empty.
+        return parser.rows or [[_NO_DATA_MESSAGE]]
+    # Without the table id only trust schedule-shaped rows: a login or error page
+    # served with status 200 has tables too.
+    if parser.rows and all(len(row) == len(HEARING_COLUMNS) for row in parser.rows):
+        return parser.rows
+    if NO_DATA_MARKER in html:
+        return [[_NO_DATA_MESSAGE]]
+    return None
+
+
+def _is_consulta_request(request: Request, case: dict) -> bool:
+    if request.method != "POST" or request.resource_type not in ("xhr", "fetch"):
+        return False
+    # Dropdown loaders and modal posts do not carry the rol and era of the case.
+    post_data = request.post_data or ""
+    values = {value for _, value in parse_qsl(post_data, keep_blank_values=True)}
+    return all(
+        str(case.get(name)) in values or str(case.get(name)) in post_data
+        for name in ("rol", "year")
+    )
+
+
+class DirectScheduleClient:
+    """
+    Replays the XHR behind `btnProgConsulta` with a pooled `httpx.AsyncClient`.
+
+    The request is captured once from a real click (`capture`), together with the
+    option label -> value maps of the form selects, and then re-sent for every case
+    with the browser cookies. `fetch` returns None whenever the replay is rejected so
+    the caller can fall back to driving the DOM.
+    """
+
+    def __init__(self, *, max_connections: int = 4, max_captures: int = 3) -> None:
+        self._client: httpx.AsyncClient | None = None
+        self._max_connections = max_connections
+        self._captures_left = max_captures
+        self._url: str | None = None
+        self._headers: dict[str, str] = {}
+        self._form: list[tuple[str, str]] = []
+        self._field_keys: dict[str, str] = {}
+        self._options: dict[str, dict[str, str]] = {}
+        self.hits = 0
+        self.fallbacks = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._url is not None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ready or self._captures_left > 0
+
+    async def capture(self, page: Page, submit, case: dict) -> None:
+        """
+        Run `submit()` (which must only click btnProgConsulta, with the form of `case`
+        already filled) while listening for the consulta request, then learn how to
+        rebuild it for other cases.
+        """
+        self._captures_left -= 1
+        async with page.expect_request(
+            lambda request: _is_consulta_request(request, case)
+        ) as request_info:
+            await submit()
+        request = await request_info.value
+
+        content_type = (await request.header_value("content-type")) or ""
+        post_data = request.post_data or ""
+        if "application/x-www-form-urlencoded" not in content_type or not post_data:
+            # Only classic jQuery form posts can be rebuilt safely.
+            self._captures_left = 0
+            return
+
+        form_state = await page.evaluate(_READ_FORM_JS, list(_FORM_FIELDS))
+        values: dict[str, str] = form_state.get("values", {})
+        self._options = {
+            field_id: {label: value for label, value in options}
+            for field_id, options in form_state.get("options", {}).items()
+        }
+
+        form = parse_qsl(post_data, keep_blank_values=True)
+        field_keys: dict[str, str] = {}
+        for field_id, case_key in _FORM_FIELDS.items():
+            if any(key == field_id for key, _ in form):
+                field_keys[case_key] = field_id
+                continue
+            # The script may rename the fields; match them by the value they carried.
+            current = values.get(field_id)
+            matches = [key for key, value in form if current and value == current]
+            if len(matches) == 1:
+                field_keys[case_key] = matches[0]
+        if "rol" not in field_keys or "year" not in field_keys:
+            self._captures_left = 0
+            return
+
+        self._headers = {
+            name: value
+            for name, value in (await request.all_headers()).items()
+            if name.lower() not in _SKIPPED_HEADERS and not name.startswith(":")
+        }
+        self._form = form
+        self._field_keys = field_keys
+        self._url = request.url
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(connect=10.0, read=30.0, write=10.0, pool=30.0),
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_connections,
+                ),
+            )
+        self._client.cookies.clear()
+        for cookie in await page.context.cookies(request.url):
+            self._client.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"]
+            )
+
+    def _build_form(self, case: dict) -> list[tuple[str, str]] | None:
+        replacements: dict[str, str] = {}
+        for field_id, case_key in _FORM_FIELDS.items():
+            key = self._field_keys.get(case_key)
+            if key is None:
+                continue
+            value = case.get(case_key)
+            if field_id in _SELECT_FIELDS:
+                if not value:
+                    continue
+                options = self._options.get(field_id, {})
+                if value not in options:
+                    # Dependent dropdowns (e.g. books) may not have been loaded at capture time.
+                    return None
+                value = options[value]
+            replacements[key] = "" if value is None else str(value)
+        if case.get("competency") == "Corte Apelaciones" and (
+            "court" not in self._field_keys or "book" not in self._field_keys
+        ):
+            return None
+        return [(key, replacements.get(key, value)) for key, value in self._form]
+
+    def can_replay(self, case: dict) -> bool:
+        """
+        Whether `case` can be rebuilt from the captured request (e.g. not a Corte
+        Apelaciones case after a Suprema capture). Cases that cannot are counted as
+        fallbacks and go straight to the DOM path: the portal rejected nothing.
+        """
+        if not self.ready:
+            return False
+        if self._build_form(case) is None:
+            self.fallbacks += 1
+            return False
+        return True
+
+    def _invalidate(self) -> None:
+        # Force a fresh capture (new cookies / tokens) on the next DOM-driven case.
+        self._url = None
+
+    async def fetch(self, case: dict) -> list[list[str]] | None:
+        if not self.ready or self._client is None:
+            return None
+        form = self._build_form(case)
+        if form is None:
+            # Only when `can_replay` was not checked first.
+            self.fallbacks += 1
+            return None
+        try:
+            resp = await self._client.post(
+                self._url, content=urlencode(form), headers=self._headers
+            )
+        except httpx.HTTPError:
+            self.fallbacks += 1
+            return None
+        if resp.status_code != 200 or "captcha" in resp.text.lower():
+            self.fallbacks += 1
+            self._invalidate()
+            return None
+        rows = parse_schedule_html(resp.text)
+        if rows is None:
+            self.fallbacks += 1
+            self._invalidate()
+            return None
+        self.hits += 1
+        return rows
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
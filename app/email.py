@@ -1,8 +1,20 @@
 from datetime import date, datetime
+from functools import lru_cache
 from html import escape
-from typing import Any, Mapping
+from typing import Any, Iterable, Iterator, Mapping
 from zoneinfo import ZoneInfo
 
+from app.changes import ScheduleDiff
+from app.records import (
+    HEARING_COLUMNS,
+    SCRAPE_ERROR,
+    NoData,
+    Schedule,
+    ScheduleError,
+    ScheduleResult,
+)
+from app.timing import timed
+
 DEFAULT_TZ = ZoneInfo("America/Santiago")
 
 _REPORT_CSS = """
@@ -137,16 +149,6 @@ def _extract_case_fields(case_wrapper: Mapping[str, Any] | None) -> Mapping[str,
     return case_wrapper
 
 
-def _parse_ddmmyyyy(value: str, tz: ZoneInfo = DEFAULT_TZ) -> date | None:
-    try:
-        # Expected format from PJUD table: "dd/mm/yyyy"
-        # Date from string is timezone-agnostic; tz exists to keep call-sites consistent.
-        _ = tz
-        return datetime.strptime(value.strip(), "%d/%m/%Y").date()
-    except ValueError:
-        return None
-
-
 def _case_meta_line(case_wrapper: Mapping[str, Any] | None) -> str:
     case_fields = _extract_case_fields(case_wrapper)
     if not case_fields:
@@ -165,208 +167,230 @@ def _case_meta_line(case_wrapper: Mapping[str, Any] | None) -> str:
     return " · ".join(chunks) if chunks else "Sin metadata de caso"
 
 
-def _is_no_data_message(schedule: list[list[str]] | None) -> str | None:
-    """
-    PJUD sometimes returns a single-cell row: ["Ningún dato disponible en esta tabla"]
-    If so, return that message to show it nicely; otherwise None.
-    """
-    if not schedule:
-        return None
-    if len(schedule) == 1 and len(schedule[0]) == 1:
-        msg = schedule[0][0] or ""
-        if "Ningún dato disponible" in msg:
-            return msg
-    return None
-
-
-def render_schedule_results_email_html(
-    schedules: list[list[list[str]] | str],
-    *,
-    cases: list[dict] | None = None,
-) -> str:
-    """
-    Gmail/email-client friendly HTML:
-    - Uses table-based layout (nested tables)
-    - Uses inline styles only (no <style> tag)
-    - Avoids modern CSS features that are inconsistently supported in email clients
-    """
-    now = datetime.now(DEFAULT_TZ)
-    today = now.date()
-    generated_at = now.strftime("%d/%m/%Y %H:%M:%S")
+# Inline style fragments, built once (email clients ignore <style> blocks).
+_TEXT = "color:#eaf2ff;"
+_MUTED = "color:#8aa0bd;"
+_BORDER = "border:1px solid rgba(255,255,255,0.10);"
+_BADGE_STYLES = {
+    "ok": "border:1px solid rgba(45,212,191,0.55); background-color:rgba(45,212,191,0.12);",
+    "bad": "border:1px solid rgba(251,113,133,0.55); background-color:rgba(251,113,133,0.12);",
+    "neutral": "border:1px solid rgba(255,255,255,0.12); background-color:rgba(255,255,255,0.06);",
+}
+_PAGE_OPEN = (
+    "<!doctype html><html><body>"
+    '<table role="presentation" cellpadding="0" cellspacing="0" width="100%" '
+    f'style="background-color:#0b1220; font-family:Arial, Helvetica, sans-serif; {_TEXT} padding:0; margin:0;">'
+    '<tr><td align="center" style="padding:24px 12px;">'
+    '<table role="presentation" cellpadding="0" cellspacing="0" width="100%" style="max-width:900px;">'
+    "<tr><td>"
+    f'<div style="font-size:18px; font-weight:700; {_TEXT}">Resultados — Programación de Sala</div>'
+    f'<div style="margin-top:6px; font-size:12px; {_MUTED}">Generado: {{generated_at}}</div>'
+    f'<div style="margin-top:8px; font-size:12px; {_MUTED}">Se marca como <b style="{_TEXT}">FUTURA</b> cualquier fecha mayor a la fecha actual.</div>'
+    "</td></tr>"
+)
+_PAGE_CLOSE = (
+    '<tr><td style="padding-top:16px;">'
+    f'<div style="text-align:center; font-size:12px; {_MUTED}">Automatizador legal · Reporte</div>'
+    "</td></tr></table></td></tr></table>"
+    "</body></html>"
+)
+_CARD_OPEN = (
+    '<tr><td style="padding-top:14px;">'
+    '<table role="presentation" cellpadding="0" cellspacing="0" width="100%" '
+    f'style="background-color:#0f1b2d; {_BORDER} border-radius:12px; overflow:hidden;">'
+    '<tr><td style="padding:14px 14px 10px;">'
+    f'<div style="font-size:14px; font-weight:700; {_TEXT}">Caso #{{number}}</div>'
+    f'<div style="margin-top:4px; font-size:12px; {_MUTED}">{{meta}}</div>'
+    '<div style="margin-top:10px;">'
+)
+_CARD_CLOSE = "</table></td></tr>"
+_NOTE = f'<tr><td style="padding:12px 14px 14px; font-size:12px; {_MUTED}">{{}}</td></tr>'
+_CHANGES_NOTE = f'<tr><td style="padding:0 14px 10px; font-size:12px; {_MUTED}">'
+_ERROR_NOTE = (
+    '<tr><td style="padding:12px 14px 14px; font-size:13px; color:#fb7185;">'
+    "<strong>{}:</strong> {}</td></tr>"
+)
+_TABLE_OPEN = (
+    '<tr><td style="padding:0 14px 14px;">'
+    '<table role="presentation" cellpadding="0" cellspacing="0" width="100%" '
+    f'style="border-collapse:collapse; {_BORDER} border-radius:10px;">'
+)
+_TH = (
+    f'<td style="padding:10px 10px; font-size:12px; font-weight:700; {_MUTED} '
+    'background-color:rgba(255,255,255,0.04); border-bottom:1px solid rgba(255,255,255,0.10);">'
+)
+_TD = (
+    f'<td style="padding:10px 10px; font-size:12px; {_TEXT} '
+    'border-bottom:1px solid rgba(255,255,255,0.10);">'
+)
+_TD_DATE = (
+    f'<td style="padding:10px 10px; font-size:12px; {_TEXT} '
+    'border-bottom:1px solid rgba(255,255,255,0.10); white-space:nowrap;">'
+)
+_TD_DATE_FUTURE = (
+    '<td style="padding:10px 10px; font-size:12px; color:#fb7185; font-weight:700; '
+    'border-bottom:1px solid rgba(255,255,255,0.10); white-space:nowrap;">'
+)
+_FUTURE_PILL = (
+    ' <span style="display:inline-block; margin-left:6px; padding:2px 8px; '
+    "border-radius:999px; font-size:11px; "
+    "border:1px solid rgba(251,113,133,0.55); background-color:rgba(251,113,133,0.12); "
+    f'{_TEXT}">FUTURA</span>'
+)
+_TR = '<tr style="">'
+_TR_FUTURE = '<tr style="background-color:rgba(251,113,133,0.06);">'
+_HEADER_ROW = "<tr>" + "".join(f"{_TH}{escape(h)}</td>" for h in HEARING_COLUMNS) + "</tr>"
 
-    # Common inline styles
-    page_bg = "background-color:#0b1220;"
-    text = "color:#eaf2ff;"
-    muted = "color:#8aa0bd;"
-    card_bg = "background-color:#0f1b2d;"
-    border = "border:1px solid rgba(255,255,255,0.10);"
-    radius = "border-radius:12px;"
-    font = "font-family:Arial, Helvetica, sans-serif;"
+# Sala names, dates and courts repeat across thousands of rows.
+_escape = lru_cache(maxsize=16384)(escape)
 
-    def badge(label: str, *, variant: str = "neutral") -> str:
-        if variant == "ok":
-            b = "border:1px solid rgba(45,212,191,0.55); background-color:rgba(45,212,191,0.12);"
-        elif variant == "bad":
-            b = "border:1px solid rgba(251,113,133,0.55); background-color:rgba(251,113,133,0.12);"
-        else:
-            b = "border:1px solid rgba(255,255,255,0.12); background-color:rgba(255,255,255,0.06);"
-        return (
-            f'<span style="display:inline-block; padding:6px 10px; border-radius:999px; '
-            f'font-size:12px; {text} {b}">{escape(label)}</span>'
-        )
 
-    parts: list[str] = []
-    parts.append("<!doctype html><html><body>")
-    parts.append(
-        f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" style="{page_bg} {font} {text} padding:0; margin:0;">'
-        '<tr><td align="center" style="padding:24px 12px;">'
-        f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" style="max-width:900px;">'
-        "<tr><td>"
-        f'<div style="font-size:18px; font-weight:700; {text}">Resultados — Programación de Sala</div>'
-        f'<div style="margin-top:6px; font-size:12px; {muted}">Generado: {escape(generated_at)}</div>'
-        f'<div style="margin-top:8px; font-size:12px; {muted}">Se marca como <b style="{text}">FUTURA</b> cualquier fecha mayor a la fecha actual.</div>'
-        "</td></tr>"
+def _badge(label: str, variant: str = "neutral") -> str:
+    return (
+        '<span style="display:inline-block; padding:6px 10px; border-radius:999px; '
+        f'font-size:12px; {_TEXT} {_BADGE_STYLES[variant]}">{_escape(label)}</span>'
     )
 
-    for idx, schedule in enumerate(schedules, start=1):
-        case_wrapper = cases[idx - 1] if cases and idx - 1 < len(cases) else None
-        meta_line = _case_meta_line(
-            case_wrapper if isinstance(case_wrapper, Mapping) else None
-        )
 
-        is_error = isinstance(schedule, str)
-        rows = []
-        future_rows = 0
-        
-        if not is_error:
-            rows = [r for r in (schedule or []) if r]
-            future_rows = sum(
-                1
-                for r in rows
-                if (parsed := _parse_ddmmyyyy(r[-1] if r else "")) is not None
-                and parsed > today
-            )
+def _render_case(
+    number: int,
+    schedule: ScheduleResult,
+    case_wrapper: Any,
+    change: ScheduleDiff | None,
+    today: date,
+) -> str:
+    meta_line = _case_meta_line(case_wrapper if isinstance(case_wrapper, Mapping) else None)
+    parts = [_CARD_OPEN.format(number=number, meta=_escape(meta_line))]
 
-        parts.append('<tr><td style="padding-top:14px;">')
+    if isinstance(schedule, ScheduleError):
+        is_scrape_error = schedule.kind == SCRAPE_ERROR
         parts.append(
-            f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" '
-            f'style="{card_bg} {border} {radius} overflow:hidden;">'
+            _badge("Error de consulta" if is_scrape_error else "Error de validación", "bad")
         )
-        # Card head
-        parts.append('<tr><td style="padding:14px 14px 10px;">')
-        parts.append(
-            f'<div style="font-size:14px; font-weight:700; {text}">Caso #{idx}</div>'
-            f'<div style="margin-top:4px; font-size:12px; {muted}">{escape(meta_line)}</div>'
-        )
-        parts.append('<div style="margin-top:10px;">')
-        if is_error:
-            parts.append(badge("Error de validación", variant="bad"))
-        else:
-            parts.append(badge(f"Filas: {len(rows)}", variant="ok"))
+    else:
+        hearings = schedule.hearings if isinstance(schedule, Schedule) else ()
+        # A "no data" answer is still shown as one row, like the portal does.
+        rows = len(hearings) if isinstance(schedule, Schedule) else 1
+        future_rows = sum(1 for h in hearings if h.fecha is not None and h.fecha > today)
+        parts.append(_badge(f"Filas: {rows}", "ok"))
+        parts.append("&nbsp;")
+        parts.append(_badge(f"Fechas futuras: {future_rows}", "bad" if future_rows else "neutral"))
+        if change is not None and change.first_seen:
             parts.append("&nbsp;")
-            parts.append(
-                badge(
-                    f"Fechas futuras: {future_rows}",
-                    variant=("bad" if future_rows else "neutral"),
-                )
-            )
-        parts.append("</div>")
-        parts.append("</td></tr>")
+            parts.append(_badge("Primera consulta"))
+        elif change is not None and change.changed:
+            for label, count in (
+                ("Nuevas", len(change.added)),
+                ("Reprogramadas", len(change.rescheduled)),
+                ("Eliminadas", len(change.removed)),
+            ):
+                if count:
+                    parts.append("&nbsp;")
+                    parts.append(_badge(f"{label}: {count}", "bad"))
+    parts.append("</div></td></tr>")
 
-        if is_error:
-            parts.append(
-                f'<tr><td style="padding:12px 14px 14px; font-size:13px; color:#fb7185;">'
-                f'<strong>Fallo la validación:</strong> {escape(schedule)}'
-                f'</td></tr>'
-            )
-            parts.append("</table></td></tr>")
-            continue
+    if change is not None and (change.removed or change.rescheduled):
+        # Removed hearings are no longer in the table below; list them here.
+        lines = [f"Eliminada: {' · '.join(h.row())}" for h in change.removed] + [
+            f"Reprogramada: {old.fecha_text} → {new.fecha_text} ({' · '.join(new.identity())})"
+            for old, new in change.rescheduled
+        ]
+        parts.append(_CHANGES_NOTE + "<br>".join(escape(line) for line in lines) + "</td></tr>")
 
-        if not rows:
+    if isinstance(schedule, ScheduleError):
+        label = "Falló la consulta" if is_scrape_error else "Fallo la validación"
+        parts.append(_ERROR_NOTE.format(label, escape(schedule.message)))
+    elif isinstance(schedule, NoData):
+        parts.append(_NOTE.format(escape(schedule.message)))
+    elif not schedule.hearings:
+        parts.append(_NOTE.format("Sin resultados."))
+    else:
+        parts.append(_TABLE_OPEN)
+        parts.append(_HEADER_ROW)
+        for h in schedule.hearings:
+            is_future = h.fecha is not None and h.fecha > today
+            parts.append(_TR_FUTURE if is_future else _TR)
             parts.append(
-                f'<tr><td style="padding:12px 14px 14px; font-size:12px; {muted}">Sin resultados.</td></tr>'
+                f"{_TD}{_escape(h.sala)}</td>{_TD}{_escape(h.numero)}</td>"
+                f"{_TD}{_escape(h.causa)}</td>{_TD}{_escape(h.ingreso)}</td>"
             )
-            parts.append("</table></td></tr>")
-            continue
+            if is_future:
+                parts.append(f"{_TD_DATE_FUTURE}{_escape(h.fecha_text)}{_FUTURE_PILL}</td>")
+            else:
+                parts.append(f"{_TD_DATE}{_escape(h.fecha_text)}</td>")
+            parts.append("</tr>")
+        parts.append(_CARD_CLOSE)
+    parts.append(_CARD_CLOSE)
+    return "".join(parts)
 
-        if msg := _is_no_data_message(schedule):
-            parts.append(
-                f'<tr><td style="padding:12px 14px 14px; font-size:12px; {muted}">{escape(msg)}</td></tr>'
-            )
-            parts.append("</table></td></tr>")
-            continue
 
-        # Table of rows (simple, no sticky headers)
-        max_cols = max((len(r) for r in rows), default=0)
-        headers = ["Sala", "Número", "Causa", "Ingreso", "Fecha"]
-        # Keep safe if upstream changes column count:
-        if max_cols and max_cols != len(headers):
-            headers = [f"Columna {i}" for i in range(1, max_cols + 1)]
-            headers[-1] = "Fecha"
+# (case number, result, case, change)
+ReportItem = tuple[int, ScheduleResult, Any, ScheduleDiff | None]
 
-        parts.append('<tr><td style="padding:0 14px 14px;">')
-        parts.append(
-            f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" '
-            f'style="border-collapse:collapse; {border} border-radius:10px;">'
+
+def iter_schedule_results_email_html(items: Iterable[ReportItem]) -> Iterator[str]:
+    """
+    Yield the report as HTML chunks: the page header, one chunk per case and the footer.
+    `items` are consumed lazily, so a large report never has to be held in memory as a whole.
+    """
+    now = datetime.now(DEFAULT_TZ)
+    today = now.date()
+    yield _PAGE_OPEN.format(generated_at=escape(now.strftime("%d/%m/%Y %H:%M:%S")))
+    for number, schedule, case_wrapper, change in items:
+        yield _render_case(number, schedule, case_wrapper, change, today)
+    yield _PAGE_CLOSE
+
+
+def _iter_report_chunks(
+    schedules: list[ScheduleResult],
+    *,
+    cases: list[dict] | None = None,
+    numbers: list[int] | None = None,
+    changes: list[ScheduleDiff | None] | None = None,
+) -> Iterator[str]:
+    return iter_schedule_results_email_html(
+        (
+            numbers[i] if numbers else i + 1,
+            schedule,
+            cases[i] if cases and i < len(cases) else None,
+            changes[i] if changes and i < len(changes) else None,
         )
-        # header row
-        parts.append("<tr>")
-        for h in headers:
-            parts.append(
-                f'<td style="padding:10px 10px; font-size:12px; font-weight:700; {muted} '
-                f'background-color:rgba(255,255,255,0.04); border-bottom:1px solid rgba(255,255,255,0.10);">'
-                f"{escape(h)}</td>"
-            )
-        parts.append("</tr>")
+        for i, schedule in enumerate(schedules)
+    )
 
-        for r in rows:
-            padded = (r + [""] * max(0, len(headers) - len(r)))[: len(headers)]
-            parsed = _parse_ddmmyyyy(padded[-1]) if padded else None
-            is_future = bool(parsed and parsed > today)
-            row_bg = "background-color:rgba(251,113,133,0.06);" if is_future else ""
-            parts.append(f'<tr style="{row_bg}">')
-            for col_idx, cell in enumerate(padded):
-                if col_idx == len(headers) - 1:
-                    date_style = (
-                        "color:#fb7185; font-weight:700;" if is_future else text
-                    )
-                    fut = ""
-                    if is_future:
-                        fut = (
-                            ' <span style="display:inline-block; margin-left:6px; padding:2px 8px; '
-                            "border-radius:999px; font-size:11px; "
-                            "border:1px solid rgba(251,113,133,0.55); background-color:rgba(251,113,133,0.12); "
-                            f'{text}">FUTURA</span>'
-                        )
-                    parts.append(
-                        f'<td style="padding:10px 10px; font-size:12px; {date_style} '
-                        f'border-bottom:1px solid rgba(255,255,255,0.10); white-space:nowrap;">'
-                        f"{escape(cell)}{fut}</td>"
-                    )
-                else:
-                    parts.append(
-                        f'<td style="padding:10px 10px; font-size:12px; {text} '
-                        f'border-bottom:1px solid rgba(255,255,255,0.10);">'
-                        f"{escape(cell)}</td>"
-                    )
-            parts.append("</tr>")
 
-        parts.append("</table></td></tr>")
-        parts.append("</table></td></tr>")
+@timed("report_render")
+def render_schedule_results_email_html(
+    schedules: list[ScheduleResult],
+    *,
+    cases: list[dict] | None = None,
+    numbers: list[int] | None = None,
+    changes: list[ScheduleDiff | None] | None = None,
+) -> str:
+    """
+    Gmail/email-client friendly HTML:
+    - Uses table-based layout (nested tables)
+    - Uses inline styles only (no <style> tag)
+    - Avoids modern CSS features that are inconsistently supported in email clients
 
-    parts.append(
-        '<tr><td style="padding-top:16px;">'
-        f'<div style="text-align:center; font-size:12px; {muted}">Automatizador legal · Reporte</div>'
-        "</td></tr></table></td></tr></table>"
+    Each case is a `Schedule`, `NoData` or `ScheduleError` record (whose `kind` tells
+    scraping failures apart from validation errors). `numbers` keeps the original case numbers
+    when only some cases are rendered, and `changes` adds what changed since the
+    previous run to each card.
+    """
+    return "".join(
+        _iter_report_chunks(schedules, cases=cases, numbers=numbers, changes=changes)
     )
-    parts.append("</body></html>")
-    return "".join(parts)
 
 
 def process_schedule_results(
-    schedule_results: list[list[list[str]] | str],
+    schedule_results: list[ScheduleResult],
     *,
     cases: list[dict] | None = None,
+    numbers: list[int] | None = None,
+    changes: list[ScheduleDiff | None] | None = None,
 ) -> str:
     """Backwards-compatible name used by the endpoint."""
-    return render_schedule_results_email_html(schedule_results, cases=cases)
+    return render_schedule_results_email_html(
+        schedule_results, cases=cases, numbers=numbers, changes=changes
+    )
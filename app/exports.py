@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import io
+import json
+from datetime import date, datetime, timezone
+from typing import Any, Iterable, Iterator
+
+from app.email import DEFAULT_TZ, _extract_case_fields
+from app.records import Schedule, ScheduleError, ScheduleResult
+
+# Finished case as read back from the job store: (idx, case, status, result).
+CaseResult = tuple[int, Any, str, ScheduleResult]
+
+RECORD_FIELDS = (
+    "case_index",
+    "competency",
+    "court",
+    "book",
+    "rol",
+    "year",
+    "status",
+    "sala",
+    "numero",
+    "causa",
+    "ingreso",
+    "fecha",
+    "error",
+)
+_CASE_FIELDS = ("competency", "court", "book", "rol", "year")
+_HEARING_FIELDS = ("sala", "numero", "causa", "ingreso")
+
+
+def iter_hearing_records(results: Iterable[CaseResult]) -> Iterator[dict[str, Any]]:
+    """
+    Flatten case results into one record per hearing, with `fecha` parsed to a date.
+    Cases without hearings (no data, failed or invalid) still produce one record with
+    empty hearing fields, so every case is represented.
+    """
+    for idx, case_wrapper, status, result in results:
+        case_fields = _extract_case_fields(case_wrapper)
+        base = {"case_index": idx, **{k: case_fields.get(k) for k in _CASE_FIELDS}, "status": status}
+        hearings = result.hearings if isinstance(result, Schedule) else ()
+        if not hearings:
+            yield {
+                **base,
+                **dict.fromkeys(_HEARING_FIELDS),
+                "fecha": None,
+                "error": result.message if isinstance(result, ScheduleError) else None,
+            }
+            continue
+        for h in hearings:
+            yield {
+                **base,
+                "sala": h.sala,
+                "numero": h.numero,
+                "causa": h.causa,
+                "ingreso": h.ingreso,
+                "fecha": h.fecha,
+                "error": None,
+            }
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def iter_json(results: Iterable[CaseResult]) -> Iterator[str]:
+    """Compact JSON array of hearing records (ISO dates), one record per chunk."""
+    yield "["
+    separator = ""
+    for record in iter_hearing_records(results):
+        yield separator + json.dumps(
+            record, default=_json_default, ensure_ascii=False, separators=(",", ":")
+        )
+        separator = ","
+    yield "]"
+
+
+def iter_csv(results: Iterable[CaseResult], *, batch_size: int = 500) -> Iterator[str]:
+    """CSV with a header row; emitted every `batch_size` records."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RECORD_FIELDS)
+    for n, record in enumerate(iter_hearing_records(results), start=1):
+        record["fecha"] = record["fecha"].isoformat() if record["fecha"] else None
+        writer.writerow(record[name] for name in RECORD_FIELDS)
+        if n % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_columnar(results: Iterable[CaseResult], *, batch_size: int = 1000) -> Iterator[str]:
+    """
+    Newline-delimited JSON of column batches ("row groups"): each line is
+    {"rows": n, "columns": {field: [values...]}}. Downstream tools can read a
+    column without decoding every record (e.g. pandas/polars concat per batch).
+    """
+    columns: dict[str, list] = {name: [] for name in RECORD_FIELDS}
+    rows = 0
+
+    def flush() -> str:
+        line = json.dumps(
+            {"rows": rows, "columns": columns},
+            default=_json_default,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return line + "\n"
+
+    for record in iter_hearing_records(results):
+        for name in RECORD_FIELDS:
+            columns[name].append(record[name])
+        rows += 1
+        if rows == batch_size:
+            yield flush()
+            columns = {name: [] for name in RECORD_FIELDS}
+            rows = 0
+    if rows:
+        yield flush()
+
+
+def _ics_text(value: Any) -> str:
+    text = str(value or "")
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def _ics_line(line: str) -> str:
+    # RFC 5545: lines longer than 75 octets are folded with CRLF + space.
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    chunks, current = [], b""
+    for ch in line:
+        b = ch.encode("utf-8")
+        if len(current) + len(b) > (75 if not chunks else 74):
+            chunks.append(current.decode("utf-8"))
+            current = b""
+        current += b
+    chunks.append(current.decode("utf-8"))
+    return "\r\n ".join(chunks) + "\r\n"
+
+
+def iter_ics(results: Iterable[CaseResult], *, today: date | None = None) -> Iterator[str]:
+    """iCalendar feed with one all-day event per future hearing."""
+    today = today or datetime.now(DEFAULT_TZ).date()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "".join(
+        _ics_line(line)
+        for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//Automatizador legal//Programacion de Sala//ES",
+            "CALSCALE:GREGORIAN",
+            "X-WR-CALNAME:Programación de Sala",
+        )
+    )
+    for record in iter_hearing_records(results):
+        fecha = record["fecha"]
+        if fecha is None or fecha <= today:
+            continue
+        identity = json.dumps(
+            [record[name] for name in (*_CASE_FIELDS, *_HEARING_FIELDS)], ensure_ascii=False
+        )
+        uid = hashlib.sha1(f"{identity}|{fecha}".encode()).hexdigest()
+        case_label = " ".join(str(record[k]) for k in ("competency", "rol", "year") if record[k])
+        summary = f"Audiencia {case_label}" + (f" - {record['sala']}" if record["sala"] else "")
+        details = " · ".join(
+            str(record[k]) for k in (*_CASE_FIELDS, *_HEARING_FIELDS) if record[k]
+        )
+        yield "".join(
+            _ics_line(line)
+            for line in (
+                "BEGIN:VEVENT",
+                f"UID:{uid}@automatizador-legal",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART;VALUE=DATE:{fecha:%Y%m%d}",
+                f"SUMMARY:{_ics_text(summary)}",
+                f"DESCRIPTION:{_ics_text(details)}",
+                "END:VEVENT",
+            )
+        )
+    yield "END:VCALENDAR\r\n"
+
+
+# format -> (streaming writer, media type)
+EXPORT_FORMATS = {
+    "json": (iter_json, "application/json"),
+    "csv": (iter_csv, "text/csv; charset=utf-8"),
+    "columnar": (iter_columnar, "application/x-ndjson"),
+    "ics": (iter_ics, "text/calendar; charset=utf-8"),
+}
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    params TEXT NOT NULL,
+    cases TEXT NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS job_cases (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+"""
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+# Finished, but some cases still failed after their retries.
+PARTIAL = "partial"
+FAILED = "failed"
+
+# Case statuses ("pending" cases have no row in job_cases)
+CASE_PENDING = "pending"
+CASE_DONE = "done"
+CASE_INVALID = "invalid"
+CASE_FAILED = "failed"
+
+
+class JobStore:
+    """
+    Persistent job queue (SQLite). Every case result is checkpointed as soon as it is
+    known, so a job interrupted by a restart only re-scrapes its pending cases.
+    The async methods run the blocking sqlite calls off the event loop.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        if not self._initialized:
+            conn.executescript(_SCHEMA)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _execute(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        conn = self._connect()
+        try:
+            with conn:
+                return fn(conn)
+        finally:
+            conn.close()
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.to_thread(self._execute, fn)
+
+    async def create(
+        self, job_id: str, cases: list[dict], params: dict[str, Any], *, priority: int = 0
+    ) -> None:
+        now = time.time()
+        await self._run(
+            lambda conn: conn.execute(
+                "INSERT INTO jobs (job_id, status, priority, created_at, updated_at, params, cases) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, priority, now, now, json.dumps(params), json.dumps(cases)),
+            )
+        )
+
+    async def set_cases(self, job_id: str, cases: list[dict]) -> None:
+        """Store the cases of a job whose rows were streamed from an upload."""
+        await self._run(
+            lambda conn: conn.execute(
+                "UPDATE jobs SET cases = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(cases), time.time(), job_id),
+            )
+        )
+
+    async def claim_next(self) -> dict[str, Any] | None:
+        """Mark the highest-priority (then oldest) queued job as running and return it."""
+
+        def claim(conn: sqlite3.Connection) -> dict[str, Any] | None:
+            row = conn.execute(
+                "SELECT job_id, params, cases FROM jobs WHERE status = ? "
+                "ORDER BY priority DESC, created_at ASC LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                (RUNNING, time.time(), row[0]),
+            )
+            return {"job_id": row[0], "params": json.loads(row[1]), "cases": json.loads(row[2])}
+
+        return await self._run(claim)
+
+    async def requeue_interrupted(self) -> int:
+        """Jobs left running by a previous process go back to the queue."""
+        cursor = await self._run(
+            lambda conn: conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, time.time(), RUNNING),
+            )
+        )
+        return cursor.rowcount
+
+    async def save_case(self, job_id: str, idx: int, status: str, result: Any) -> None:
+        await self._run(
+            lambda conn: conn.execute(
+                "INSERT OR REPLACE INTO job_cases (job_id, idx, status, result) VALUES (?, ?, ?, ?)",
+                (job_id, idx, status, json.dumps(result)),
+            )
+        )
+
+    async def case_results(self, job_id: str) -> dict[int, tuple[str, Any]]:
+        rows = await self._run(
+            lambda conn: conn.execute(
+                "SELECT idx, status, result FROM job_cases WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        )
+        return {idx: (status, json.loads(result)) for idx, status, result in rows}
+
+    async def finish(self, job_id: str, status: str, error: str | None = None) -> None:
+        await self._run(
+            lambda conn: conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id),
+            )
+        )
+
+    def iter_case_results(
+        self, job_id: str, *, batch_size: int = 200
+    ) -> Iterator[tuple[int, Any, str, Any]]:
+        """
+        Yield (idx, case, status, result) for the finished cases of a job, in order,
+        reading `batch_size` results at a time. Blocking: meant to be iterated from a
+        worker thread (e.g. a StreamingResponse over a sync generator).
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT cases FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            cases = json.loads(row[0]) if row else []
+            last = -1
+            while True:
+                rows = conn.execute(
+                    "SELECT idx, status, result FROM job_cases WHERE job_id = ? AND idx > ? "
+                    "ORDER BY idx LIMIT ?",
+                    (job_id, last, batch_size),
+                ).fetchall()
+                if not rows:
+                    return
+                for idx, status, result in rows:
+                    yield idx, cases[idx] if idx < len(cases) else None, status, json.loads(result)
+                last = rows[-1][0]
+        finally:
+            conn.close()
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        """Job status with per-case progress, or None if the job is unknown."""
+
+        def read(conn: sqlite3.Connection) -> dict[str, Any] | None:
+            row = conn.execute(
+                "SELECT status, priority, created_at, updated_at, cases, error, params "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            case_rows = dict(
+                conn.execute(
+                    "SELECT idx, status FROM job_cases WHERE job_id = ?", (job_id,)
+                ).fetchall()
+            )
+            # Uploaded jobs only know their row count once the file is fully read.
+            total = max(len(json.loads(row[4])), max(case_rows, default=-1) + 1)
+            case_statuses = [case_rows.get(idx, CASE_PENDING) for idx in range(total)]
+            progress = {
+                status: case_statuses.count(status)
+                for status in (CASE_PENDING, CASE_DONE, CASE_INVALID, CASE_FAILED)
+            }
+            return {
+                "job_id": job_id,
+                "status": row[0],
+                "priority": row[1],
+                "created_at": row[2],
+                "updated_at": row[3],
+                "error": row[5],
+                "params": json.loads(row[6]),
+                "total": total,
+                "progress": progress,
+                "cases": [
+                    {"index": idx, "status": status} for idx, status in enumerate(case_statuses)
+                ],
+            }
+
+        return await self._run(read)
+
+
+class JobScheduler:
+    """
+    Runs queued jobs from a `JobStore` with at most `concurrency` jobs at a time,
+    so overlapping requests never drive the same browser concurrently.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[dict[str, Any]], Awaitable[None]],
+        *,
+        concurrency: int = 1,
+    ) -> None:
+        self.store = store
+        self.runner = runner
+        self.concurrency = max(1, concurrency)
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        self._workers: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        self._wakeup.set()
+
+    def notify(self) -> None:
+        """Wake idle workers after a job has been queued."""
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._claim_lock:
+                job = await self.store.claim_next()
+            if job is None:
+                # A notify() that raced with the claim above leaves the event set,
+                # so the next loop claims again instead of missing the job.
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                await self.runner(job)
+            except Exception as e:
+                print(f"[{job['job_id']}] Error inesperado en el job: {e}")
+                await self.store.finish(job["job_id"], FAILED, str(e))
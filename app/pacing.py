@@ -0,0 +1,101 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+
+from playwright.async_api import Page
+
+
+@dataclass(frozen=True)
+class PacingProfile:
+    """
+    Delay policy between UI steps (seconds).
+    The delay starts at `base_delay`, is multiplied by `backoff_factor` after an error
+    (never below `backoff_floor`) and by `speedup_factor` after `speedup_after`
+    consecutive successes, always staying within [min_delay, max_delay].
+    """
+
+    name: str
+    base_delay: float
+    min_delay: float
+    max_delay: float
+    mouse_moves: bool
+    backoff_floor: float = 2.0
+    backoff_factor: float = 2.0
+    speedup_factor: float = 0.8
+    speedup_after: int = 3
+    # Extra pause when the portal serves a captcha / block page.
+    captcha_pause: float = 30.0
+
+
+PACING_PROFILES: dict[str, PacingProfile] = {
+    # Close to the former slow_mo=1000 + random mouse moves behaviour.
+    "stealth": PacingProfile("stealth", base_delay=1.5, min_delay=1.0, max_delay=30.0, mouse_moves=True),
+    "balanced": PacingProfile("balanced", base_delay=0.5, min_delay=0.2, max_delay=15.0, mouse_moves=True),
+    "fast": PacingProfile(
+        "fast", base_delay=0.0, min_delay=0.0, max_delay=10.0, mouse_moves=False, backoff_floor=1.0
+    ),
+}
+
+
+class PacingController:
+    """Adaptive delay shared by every page of a run, driven by observed server responses."""
+
+    def __init__(self, profile: PacingProfile) -> None:
+        self.profile = profile
+        self.delay = profile.base_delay
+        self.pause_until = 0.0
+        self._streak = 0
+
+    def success(self) -> None:
+        self._streak += 1
+        if self._streak >= self.profile.speedup_after:
+            self._streak = 0
+            self.delay = max(self.profile.min_delay, self.delay * self.profile.speedup_factor)
+
+    def failure(self, *, captcha: bool = False) -> None:
+        self._streak = 0
+        self.delay = min(
+            self.profile.max_delay,
+            max(self.profile.backoff_floor, self.delay * self.profile.backoff_factor),
+        )
+        if captcha:
+            self.hold(self.profile.captcha_pause)
+
+    def hold(self, seconds: float) -> None:
+        """Keep every page of the run idle for at least `seconds`."""
+        self.pause_until = max(self.pause_until, time.monotonic() + seconds)
+
+    def pacer(self) -> "Pacer":
+        return Pacer(self)
+
+
+class Pacer:
+    """Per-page view of a `PacingController`; tracks the time this page spent pacing."""
+
+    def __init__(self, controller: PacingController) -> None:
+        self.controller = controller
+        self.pacing_seconds = 0.0
+
+    async def pause(self) -> None:
+        controller = self.controller
+        delay = controller.delay * random.uniform(0.5, 1.5)
+        delay = max(delay, controller.pause_until - time.monotonic())
+        if delay > 0:
+            self.pacing_seconds += delay
+            await asyncio.sleep(delay)
+
+    async def step(self, page: Page) -> None:
+        """Human-like gap between two UI actions."""
+        if self.controller.profile.mouse_moves:
+            await page.mouse.move(random.random() * 800, random.random() * 800)
+        await self.pause()
+
+
+def get_pacing_profile(name: str | None) -> PacingProfile:
+    if name is None:
+        return PACING_PROFILES["stealth"]
+    try:
+        return PACING_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Pacing profile {name} is not valid") from None
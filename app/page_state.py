@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+from playwright.async_api import Page
+
+# What the Programación de Sala page is showing.
+RESULTS = "results"
+NO_DATA = "no_data"
+FORM = "form"  # form ready, no (new) results yet
+MODAL = "modal"  # a dialog (e.g. the "Entendido" info modal) covers the form
+CAPTCHA = "captcha"  # reCAPTCHA challenge or an anti-bot block page
+SESSION_EXPIRED = "session_expired"
+MAINTENANCE = "maintenance"
+UNKNOWN = "unknown"
+
+# Recovery actions, see `recovery_for`.
+DISMISS = "dismiss"  # close the dialog and retry on the same page
+REWARM = "rewarm"  # reload Programación de Sala on the same page
+ROTATE = "rotate"  # drop the page and lease another one (another browser when sharded)
+BACKOFF = "backoff"  # pause every page of the run, then reload
+HUMAN = "human"  # CDP (visible host browser): wait for someone to solve the captcha
+
+# One round-trip classification. With `waitFor` ("results" / "form") it returns false
+# while the page is still on its way there, so it can drive `wait_for_function`.
+_CLASSIFY_JS = """
+({ tableId, waitFor }) => {
+  const visible = (el) => {
+    if (!el) return false;
+    const style = getComputedStyle(el);
+    return style.display !== "none" && style.visibility !== "hidden" && el.getClientRects().length > 0;
+  };
+  const table = document.getElementById(tableId);
+  const rows = table && table.tBodies.length ? Array.from(table.tBodies[0].rows) : [];
+  if (waitFor !== "form" && rows.length && !rows.some((tr) => tr.dataset.stale)) {
+    const only = rows.length === 1 && rows[0].cells.length === 1 ? rows[0].cells[0].innerText : "";
+    return only.includes("Ningún dato") ? "no_data" : "results";
+  }
+  const challenge = document.querySelectorAll(
+    'iframe[src*="recaptcha/api2/bframe"], iframe[src*="hcaptcha.com"], #challenge-form, #cf-challenge-running'
+  );
+  if (Array.from(challenge).some(visible)) return "captcha";
+  const form = document.getElementById("progComp");
+  const modal = Array.from(document.querySelectorAll(".modal.in, .modal.show")).find(visible);
+  if (form && !modal) {
+    if (waitFor === "results") return false;
+    return "form";
+  }
+  const text = document.body ? document.body.innerText.slice(0, 20000) : "";
+  if (/en mantenci[oó]n|mantenimiento|fuera de servicio|temporalmente no disponible|service unavailable|bad gateway/i.test(text)) {
+    return "maintenance";
+  }
+  if (/sesi[oó]n (ha )?(expirad|caducad|finalizad|terminad)|sesi[oó]n expir|vuelva a (ingresar|iniciar sesi[oó]n)/i.test(text)) {
+    return "session_expired";
+  }
+  if (/access denied|acceso denegado|request blocked|solicitud bloqueada|too many requests/i.test(text)) {
+    return "captcha";
+  }
+  if (modal) return "modal";
+  return waitFor ? false : "unknown";
+}
+"""
+
+
+class PageStateError(Exception):
+    """A step ended on something other than the expected screen."""
+
+    def __init__(self, state: str) -> None:
+        super().__init__(f"La página quedó en estado '{state}'")
+        self.state = state
+
+
+async def detect_page_state(page: Page, table_id: str) -> str:
+    """Classify the page right now; UNKNOWN if it cannot even be inspected."""
+    try:
+        return await page.evaluate(_CLASSIFY_JS, {"tableId": table_id, "waitFor": None})
+    except Exception:
+        return UNKNOWN
+
+
+async def wait_for_page_state(page: Page, table_id: str, wait_for: str) -> str:
+    """
+    Wait until the page reaches `wait_for` (RESULTS covers NO_DATA too) and return the
+    state, or raise `PageStateError` as soon as it lands on a captcha, dialog,
+    maintenance or expired-session screen instead of timing out.
+    """
+    handle = await page.wait_for_function(
+        _CLASSIFY_JS,
+        arg={"tableId": table_id, "waitFor": wait_for},
+        # Results arrive as a DOM insert; a form load may be a full navigation.
+        polling="mutation" if wait_for == RESULTS else 100,
+    )
+    state = await handle.json_value()
+    expected = (RESULTS, NO_DATA) if wait_for == RESULTS else (wait_for,)
+    if state not in expected:
+        raise PageStateError(state)
+    return state
+
+
+async def dismiss_modal(page: Page) -> None:
+    """Close the visible dialog with its own dismiss button (Escape as a fallback)."""
+    button = page.locator(
+        '.modal.in [data-dismiss="modal"]:visible, .modal.show [data-dismiss="modal"]:visible'
+    ).first
+    try:
+        await button.click(timeout=2000)
+    except Exception:
+        await page.keyboard.press("Escape")
+
+
+async def install_modal_handler(page: Page) -> None:
+    """
+    Close the Programación de Sala info modal whenever it shows up before an action,
+    so it never blocks a click until the timeout.
+    """
+    await page.add_locator_handler(
+        page.locator("#ModalInfoProgramacion"), lambda locator: dismiss_modal(locator.page)
+    )
+
+
+async def wait_for_human(page: Page, table_id: str, *, timeout: float, poll: float = 2.0) -> bool:
+    """Wait (up to `timeout` seconds) for the captcha to be solved in the visible browser."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if page.is_closed():
+            return False
+        if await detect_page_state(page, table_id) != CAPTCHA:
+            return True
+        await asyncio.sleep(poll)
+    return False
+
+
+def recovery_for(state: str, *, cdp: bool) -> str:
+    """The cheapest action that usually gets a page in `state` back to the form."""
+    if state == MODAL:
+        return DISMISS
+    if state == CAPTCHA:
+        return HUMAN if cdp else ROTATE
+    if state == MAINTENANCE:
+        return BACKOFF
+    # Expired session, half-loaded or unexpected page: start over from the home page.
+    return REWARM
@@ -1,96 +1,120 @@
+import asyncio
+import csv
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator
+
 from openpyxl import load_workbook
 
+from app.validation import validate_case, validate_cases
+
+# Column order shared by the .xlsx sheet and .csv uploads (first row is the header).
+_COLUMNS = ("competency", "rol", "year", "court", "book")
+
 
 async def read_excel(file_path: str):
-    workbook = load_workbook(file_path, read_only=True)
+    # load_workbook does blocking file I/O; keep it off the event loop.
+    workbook = await asyncio.to_thread(load_workbook, file_path, read_only=True)
     sheet = workbook.active
     return sheet
 
 
+def _cell_str(value: Any) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Excel stores numbers as floats: 2023.0 -> "2023"
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+
+def _row_to_case(row: tuple | list) -> dict | None:
+    values = [_cell_str(v) for v in list(row)[: len(_COLUMNS)]]
+    if not any(values):
+        return None
+    values += [None] * (len(_COLUMNS) - len(values))
+    return dict(zip(_COLUMNS, values))
+
+
+def iter_case_rows(file_path: str | Path) -> Iterator[dict]:
+    """
+    Yield one case dict per data row of an .xlsx (openpyxl read-only mode) or .csv file,
+    without loading the whole sheet in memory. Empty rows are skipped; rows are not
+    validated here.
+    """
+    path = Path(file_path)
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8-sig") as fh:
+            rows = csv.reader(fh)
+            next(rows, None)
+            for row in rows:
+                if case := _row_to_case(row):
+                    yield case
+        return
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(min_row=2, values_only=True):
+            if case := _row_to_case(row):
+                yield case
+    finally:
+        workbook.close()
+
+
+async def stream_case_rows(file_path: str | Path, *, buffer: int = 256) -> AsyncIterator[dict]:
+    """
+    Async version of `iter_case_rows`: the file is parsed in a worker thread and rows
+    are handed over through a bounded queue, so memory stays flat and the event loop
+    is never blocked.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+    done = object()
+    stopped = False
+
+    def produce() -> None:
+        try:
+            for case in iter_case_rows(file_path):
+                if stopped:
+                    return
+                asyncio.run_coroutine_threadsafe(queue.put(case), loop).result()
+        finally:
+            asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while (item := await queue.get()) is not done:
+            yield item
+        await producer  # re-raise parsing errors
+    finally:
+        stopped = True
+        # Unblock the producer if the consumer stopped early.
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+
+
+def _parse_rows(sheet) -> list[dict]:
+    rows = [_row_to_case(row) for row in sheet.iter_rows(min_row=2, values_only=True)]
+    reports = validate_cases(row for row in rows if row is not None)
+    for report in reports:
+        if not report.valid:
+            raise ValueError(report.message)
+    return [report.case for report in reports]
+
+
 async def parse_excel_rows(sheet):
-    cases = []
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        competency = str(row[0])
-        rol = str(row[1])
-        year = str(row[2])
-        court = None
-        book = None
-        if competency == "Corte Apelaciones":
-            court = str(row[3])
-            book = str(row[4])
-        validate_row_data(competency, rol, year, court, book)
-        cases.append(
-            {
-                "competency": competency,
-                "rol": rol,
-                "year": year,
-                "court": court,
-                "book": book,
-            }
-        )
-    return cases
+    return await asyncio.to_thread(_parse_rows, sheet)
 
 
 def validate_row_data(
     competency: str, rol: str, year: str, court: str | None, book: str | None
 ):
-
-    COMPETENCY_OPTIONS = [
-        "Corte Suprema",
-        "Corte Apelaciones",
-        "Civil",
-        "Laboral",
-        "Penal",
-        "Cobranza",
-        "Familia",
-    ]
-    COURTS_OPTIONS = [
-        "Todos",
-        "C.A. de Arica",
-        "C.A. de Iquique",
-        "C.A. de Antofagasta",
-        "C.A. de Copiapó",
-        "C.A. de La Serena",
-        "C.A. de Valparaíso",
-        "C.A. de Rancagua",
-        "C.A. de Talca",
-        "C.A. de Chillan",
-        "C.A. de Concepción",
-        "C.A. de Temuco",
-        "C.A. de Valdivia",
-        "C.A. de Puerto Montt",
-        "C.A. de Coyhaique",
-        "C.A. de Punta Arenas",
-        "C.A. de Santiago",
-        "C.A. de San Miguel",
-    ]
-    BOOKS_OPTIONS = [
-        "Todos",
-        "Civil",
-        "Familia",
-        "Laboral - Cobranza",
-        "Penal",
-        "Contencioso Administrativo",
-        "Tributario Y Aduanero",
-        "Protección",
-        "Amparo",
-        "Policia Local",
-        "Exhorto",
-        "Ley De Navegación",
-        "Ambiental",
-        "Traspaso Corte Marcial",
-        "Ministro Primera Instancia Y Fuero",
-        "Com. Lib. Cond.",
-    ]
-
-    if not competency or competency not in COMPETENCY_OPTIONS:
-        raise ValueError(f"Competency {competency} is not valid")
-    if not rol:
-        raise ValueError(f"Rol {rol} is not valid")
-    if not year:
-        raise ValueError(f"Year {year} is not valid")
-    if competency == "Corte Apelaciones" and (not court or court not in COURTS_OPTIONS):
-        raise ValueError(f"Court {court} is not valid")
-    if competency == "Corte Apelaciones" and (not book or book not in BOOKS_OPTIONS):
-        raise ValueError(f"Book {book} is not valid")
+    """Raise ValueError listing every problem of the row; see `app.validation` for the report form."""
+    report = validate_case(
+        {"competency": competency, "rol": rol, "year": year, "court": court, "book": book}
+    )
+    if not report.valid:
+        raise ValueError(report.message)
     return True
@@ -0,0 +1,131 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any
+
+# Columns of the Programación de Sala table (the date is always the last one).
+HEARING_COLUMNS = ("Sala", "Número", "Causa", "Ingreso", "Fecha")
+NO_DATA_MARKER = "Ningún dato disponible"
+
+# Leading/trailing or repeated whitespace, or any whitespace other than a plain space.
+_UNTIDY_CELL = re.compile(r"^\s|\s$|\s\s|[^\S ]")
+
+# Error kinds
+SCRAPE_ERROR = "scrape"
+VALIDATION_ERROR = "validation"
+
+
+@lru_cache(maxsize=4096)
+def parse_ddmmyyyy(value: str) -> date | None:
+    """PJUD dates ("dd/mm/yyyy"); memoized, so equal dates share one `date` object."""
+    try:
+        return datetime.strptime(value.strip(), "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class Hearing:
+    sala: str
+    numero: str
+    causa: str
+    ingreso: str
+    # Date as shown by the portal, and parsed (None if it is not a valid date).
+    fecha_text: str
+    fecha: date | None
+
+    @classmethod
+    def from_row(cls, row: list[str]) -> "Hearing":
+        head = (list(row[:-1]) + [""] * 4)[:4]
+        fecha_text = row[-1] if row else ""
+        return cls(*head, fecha_text, parse_ddmmyyyy(fecha_text))
+
+    def row(self) -> list[str]:
+        return [self.sala, self.numero, self.causa, self.ingreso, self.fecha_text]
+
+    def identity(self) -> tuple[str, str, str, str]:
+        """Everything but the date: the same hearing keeps it when rescheduled."""
+        return (self.sala, self.numero, self.causa, self.ingreso)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "sala": self.sala,
+            "numero": self.numero,
+            "causa": self.causa,
+            "ingreso": self.ingreso,
+            "fecha": self.fecha.isoformat() if self.fecha else None,
+            "fecha_texto": self.fecha_text,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class Schedule:
+    """Hearings found for a case."""
+
+    hearings: tuple[Hearing, ...]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"type": "hearings", "hearings": [h.as_dict() for h in self.hearings]}
+
+
+@dataclass(frozen=True, slots=True)
+class NoData:
+    """The portal answered, with no hearings for the case."""
+
+    message: str
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"type": "no_data", "message": self.message}
+
+
+@dataclass(frozen=True, slots=True)
+class ScheduleError:
+    """The case could not be consulted (`kind` = scrape) or is not a valid case (validation)."""
+
+    message: str
+    kind: str = SCRAPE_ERROR
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"type": "error", "kind": self.kind, "message": self.message}
+
+
+ScheduleResult = Schedule | NoData | ScheduleError
+
+
+def normalize_cell(text: str) -> str:
+    """
+    Cell text as every source reports it: one line per line break (`<br>`), words
+    separated by single spaces. The DOM's innerText keeps line breaks and stray
+    spaces, the HTML parser of the direct fetch does not, so both go through here.
+    """
+    if not _UNTIDY_CELL.search(text):
+        return text
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def schedule_from_rows(rows: list[list[str]]) -> Schedule | NoData:
+    """Build the record once from the table rows (header rows already removed)."""
+    rows = [[normalize_cell(cell or "") for cell in r] for r in rows if r]
+    if len(rows) == 1 and len(rows[0]) == 1 and NO_DATA_MARKER in (rows[0][0] or ""):
+        return NoData(rows[0][0])
+    return Schedule(tuple(Hearing.from_row(r) for r in rows))
+
+
+def schedule_to_json(result: ScheduleResult) -> list[list[str]] | str:
+    """
+    Compact storage form (cache, history, job checkpoints): the portal rows, or the
+    error message. Same shape as before the records existed, so old entries still load.
+    """
+    if isinstance(result, Schedule):
+        return [h.row() for h in result.hearings]
+    if isinstance(result, NoData):
+        return [[result.message]]
+    return result.message
+
+
+def schedule_from_json(value: list[list[str]] | str, *, kind: str = SCRAPE_ERROR) -> ScheduleResult:
+    if isinstance(value, str):
+        return ScheduleError(value, kind)
+    return schedule_from_rows(value)
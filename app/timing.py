@@ -0,0 +1,142 @@
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+# Upper bounds (seconds) of the histogram buckets: from a cached render to a slow
+# portal navigation behind a captcha.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Prometheus-style histogram: cumulative bucket counts, sum and count."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.sum += seconds
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+
+class StageTimings:
+    """
+    App-wide duration histograms per stage (browser connect, navigation, form fill,
+    table extraction, report rendering, webhook delivery), rendered for GET /metrics.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.histograms: dict[str, Histogram] = {}
+        self.errors: dict[str, int] = {}
+
+    def observe(self, stage: str, seconds: float, *, failed: bool = False) -> None:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        if failed:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def render(self, prefix: str = "automatizador") -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        name = f"{prefix}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of each scraping / reporting stage.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        errors = f"{prefix}_stage_errors_total"
+        lines += [
+            f"# HELP {errors} Stage calls that raised an exception.",
+            f"# TYPE {errors} counter",
+        ]
+        for stage, count in sorted(self.errors.items()):
+            lines.append(f'{errors}{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class JobTimings:
+    """Per-job breakdown of the same stages, attached to the job's webhook payload."""
+
+    def __init__(self) -> None:
+        self.stages: dict[str, list[float]] = {}  # stage -> [count, total, max]
+
+    def observe(self, stage: str, seconds: float) -> None:
+        entry = self.stages.setdefault(stage, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+    def as_dict(self) -> dict[str, dict[str, float]]:
+        return {
+            stage: {
+                "count": count,
+                "total_seconds": round(total, 3),
+                "mean_seconds": round(total / count, 3),
+                "max_seconds": round(slowest, 3),
+            }
+            for stage, (count, total, slowest) in self.stages.items()
+        }
+
+
+STAGE_TIMINGS = StageTimings()
+# Set while a job runs; tasks created by the job (scrape workers, page leases) inherit it.
+CURRENT_JOB_TIMINGS: ContextVar[JobTimings | None] = ContextVar("job_timings", default=None)
+
+
+def _record(stage: str, started: float, failed: bool) -> None:
+    seconds = time.perf_counter() - started
+    STAGE_TIMINGS.observe(stage, seconds, failed=failed)
+    job = CURRENT_JOB_TIMINGS.get()
+    if job is not None:
+        job.observe(stage, seconds)
+
+
+def timed(stage: str) -> Callable[[Callable], Callable]:
+    """Decorator recording each call of a sync or async function as a `stage` span."""
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                failed = True
+                try:
+                    result = await func(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    _record(stage, started, failed)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _record(stage, started, failed)
+
+        return wrapper
+
+    return decorator
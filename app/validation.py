@@ -0,0 +1,167 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+# Option labels of the Programación de Sala form (progComp / progCorte / progTipoCausa).
+COMPETENCY_OPTIONS = frozenset(
+    {
+        "Corte Suprema",
+        "Corte Apelaciones",
+        "Civil",
+        "Laboral",
+        "Penal",
+        "Cobranza",
+        "Familia",
+    }
+)
+COURTS_OPTIONS = frozenset(
+    {
+        "Todos",
+        "C.A. de Arica",
+        "C.A. de Iquique",
+        "C.A. de Antofagasta",
+        "C.A. de Copiapó",
+        "C.A. de La Serena",
+        "C.A. de Valparaíso",
+        "C.A. de Rancagua",
+        "C.A. de Talca",
+        "C.A. de Chillan",
+        "C.A. de Concepción",
+        "C.A. de Temuco",
+        "C.A. de Valdivia",
+        "C.A. de Puerto Montt",
+        "C.A. de Coyhaique",
+        "C.A. de Punta Arenas",
+        "C.A. de Santiago",
+        "C.A. de San Miguel",
+    }
+)
+BOOKS_OPTIONS = frozenset(
+    {
+        "Todos",
+        "Civil",
+        "Familia",
+        "Laboral - Cobranza",
+        "Penal",
+        "Contencioso Administrativo",
+        "Tributario Y Aduanero",
+        "Protección",
+        "Amparo",
+        "Policia Local",
+        "Exhorto",
+        "Ley De Navegación",
+        "Ambiental",
+        "Traspaso Corte Marcial",
+        "Ministro Primera Instancia Y Fuero",
+        "Com. Lib. Cond.",
+    }
+)
+
+CORTE_APELACIONES = "Corte Apelaciones"
+
+# Error codes
+MISSING = "missing"
+INVALID = "invalid"
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_label(value: Any) -> str:
+    """Lookup key for a label: no accents, case-insensitive, single spaces."""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _SPACES.sub(" ", text).strip().casefold()
+
+
+def _lookup(options: frozenset[str]) -> dict[str, str]:
+    return {normalize_label(option): option for option in options}
+
+
+# Built once: normalized spelling -> label expected by the form.
+_COMPETENCIES = _lookup(COMPETENCY_OPTIONS)
+_COURTS = _lookup(COURTS_OPTIONS)
+_BOOKS = _lookup(BOOKS_OPTIONS)
+# "C.A. de Chillán", "chillan", "Santiago" ... all resolve to the form label.
+_COURTS.update({key.removeprefix("c.a. de "): label for key, label in _COURTS.items()})
+
+
+@dataclass(frozen=True, slots=True)
+class FieldError:
+    field: str
+    code: str
+    message: str
+
+    def as_dict(self) -> dict[str, str]:
+        return {"field": self.field, "code": self.code, "message": self.message}
+
+
+@dataclass(slots=True)
+class RowValidation:
+    """Validation outcome of one row: the normalized case and its errors (empty = valid)."""
+
+    index: int
+    case: dict[str, Any]
+    errors: list[FieldError] = field(default_factory=list)
+    # Fields whose value was rewritten to the canonical label, e.g. {"court": "Chillán"}.
+    corrected: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    @property
+    def message(self) -> str:
+        return "; ".join(error.message for error in self.errors)
+
+
+def _text(value: Any) -> str | None:
+    if value is None:
+        return None
+    text = _SPACES.sub(" ", str(value)).strip()
+    return text or None
+
+
+def _resolve(
+    result: RowValidation, name: str, label: str, options: dict[str, str]
+) -> str | None:
+    value = _text(result.case.get(name))
+    if value is None:
+        result.errors.append(FieldError(name, MISSING, f"{label} {value} is not valid"))
+        return None
+    canonical = options.get(normalize_label(value))
+    if canonical is None:
+        result.errors.append(FieldError(name, INVALID, f"{label} {value} is not valid"))
+        return value
+    if canonical != result.case.get(name):
+        result.corrected[name] = str(result.case.get(name))
+    return canonical
+
+
+def validate_case(case_fields: dict[str, Any], index: int = 0) -> RowValidation:
+    """
+    Validate one case, collecting every field error instead of stopping at the first.
+    Near-miss labels (accents, case, extra spaces) are mapped to the form labels.
+    """
+    result = RowValidation(index, dict(case_fields))
+    case = result.case
+    competency = _resolve(result, "competency", "Competency", _COMPETENCIES)
+    for name, label in (("rol", "Rol"), ("year", "Year")):
+        value = _text(case.get(name))
+        if value is None:
+            result.errors.append(FieldError(name, MISSING, f"{label} {value} is not valid"))
+        case[name] = value
+    case["competency"] = competency
+    if competency == CORTE_APELACIONES:
+        case["court"] = _resolve(result, "court", "Court", _COURTS)
+        case["book"] = _resolve(result, "book", "Book", _BOOKS)
+    else:
+        # Court and book only exist on the Corte Apelaciones form.
+        case["court"] = None
+        case["book"] = None
+    return result
+
+
+def validate_cases(cases: Iterable[dict[str, Any]]) -> list[RowValidation]:
+    """Validate a whole batch in one pass; one `RowValidation` per input row."""
+    return [validate_case(case_fields, index) for index, case_fields in enumerate(cases)]
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+# Responses worth retrying (n8n restarts, Cloudflare tunnel hiccups, rate limits).
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class WebhookSender:
+    """
+    Delivers JSON payloads to the n8n webhook.
+
+    One app-lifetime `httpx.AsyncClient` (HTTP/2 + keep-alive) is opened by
+    `start()` and closed by `aclose()`. `deliver()` goes through an outbound queue
+    per job (payloads of one job arrive in order, jobs do not wait on each other);
+    each payload is retried with exponential backoff and, if it still fails, written
+    to the dead-letter `spool_dir`, which `start()` replays on the next startup.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        spool_dir: str | Path | None = None,
+        max_attempts: int = 4,
+        backoff_seconds: float = 1.0,
+        timeout: httpx.Timeout | None = None,
+    ) -> None:
+        self.url = url
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout or httpx.Timeout(connect=10.0, read=60.0, write=30.0, pool=10.0)
+        self.metrics: dict[str, float] = {
+            "delivered": 0,
+            "failed": 0,
+            "retries": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "latency_seconds_sum": 0.0,
+            "latency_seconds_max": 0.0,
+        }
+        self._client: httpx.AsyncClient | None = None
+        self._started = False
+        # job id -> its pending payloads, and the task draining them while non-empty.
+        self._lanes: dict[str, asyncio.Queue] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=120.0),
+            )
+        return self._client
+
+    async def start(self) -> None:
+        self._started = True
+        await self._replay_spool()
+
+    async def send(self, payload: dict[str, Any]) -> None:
+        """Post once with retries; raises if every attempt fails."""
+        started = time.perf_counter()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                resp = await self.client.post(self.url, json=payload)
+                if resp.status_code not in _RETRY_STATUS or attempt == self.max_attempts:
+                    resp.raise_for_status()
+                    latency = time.perf_counter() - started
+                    self.metrics["delivered"] += 1
+                    self.metrics["latency_seconds_sum"] += latency
+                    self.metrics["latency_seconds_max"] = max(
+                        self.metrics["latency_seconds_max"], latency
+                    )
+                    return
+            except httpx.TransportError:
+                if attempt == self.max_attempts:
+                    self.metrics["failed"] += 1
+                    raise
+            except httpx.HTTPStatusError:
+                self.metrics["failed"] += 1
+                raise
+            self.metrics["retries"] += 1
+            await asyncio.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+
+    def deliver(self, payload: dict[str, Any]) -> asyncio.Future:
+        """
+        Queue a payload for delivery after the earlier payloads of the same job. The
+        returned future resolves to True once delivered, or False if it ended up in
+        the dead-letter spool (or could not even be spooled).
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not self._started:
+            # Not started (e.g. used outside the app lifespan): deliver inline.
+            task = asyncio.create_task(self._deliver_one(payload, None))
+            task.add_done_callback(
+                lambda t: future.set_result(
+                    not t.cancelled() and t.exception() is None and t.result()
+                )
+            )
+        else:
+            self._enqueue(payload, None, future)
+        return future
+
+    def _enqueue(self, payload: dict[str, Any], spool_file: Path | None, future) -> None:
+        lane = str(payload.get("job_id") or "")
+        queue = self._lanes.get(lane)
+        if queue is None:
+            queue = self._lanes[lane] = asyncio.Queue()
+            self._workers[lane] = asyncio.create_task(self._drain(lane, queue))
+        queue.put_nowait((payload, spool_file, future))
+
+    async def _deliver_one(self, payload: dict[str, Any], spool_file: Path | None) -> bool:
+        try:
+            await self.send(payload)
+        except Exception as e:
+            print(f"Webhook n8n no entregado: {e}")
+            if spool_file is None:
+                self._spool(payload)
+            return False
+        if spool_file is not None:
+            spool_file.unlink(missing_ok=True)
+            self.metrics["replayed"] += 1
+        return True
+
+    async def _drain(self, lane: str, queue: asyncio.Queue) -> None:
+        try:
+            while not queue.empty():
+                payload, spool_file, future = queue.get_nowait()
+                delivered = False
+                try:
+                    delivered = await self._deliver_one(payload, spool_file)
+                except asyncio.CancelledError:
+                    # Shutting down mid-delivery: keep it for the next startup.
+                    if spool_file is None:
+                        self._try_spool(payload)
+                    raise
+                except Exception as e:
+                    # e.g. the spool cannot be written: drop this payload, keep draining.
+                    print(f"Webhook n8n descartado ({lane or 'sin job'}): {e}")
+                finally:
+                    if future is not None and not future.done():
+                        future.set_result(delivered)
+        finally:
+            # No await since the empty() check: nothing was queued behind our back.
+            if self._lanes.get(lane) is queue:
+                del self._lanes[lane]
+                del self._workers[lane]
+
+    def _spool(self, payload: dict[str, Any]) -> None:
+        if self.spool_dir is None:
+            return
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spool_dir / f"{time.time():.6f}_{uuid.uuid4().hex}.json"
+        path.write_text(json.dumps(payload), encoding="utf-8")
+        self.metrics["spooled"] += 1
+
+    def _try_spool(self, payload: dict[str, Any]) -> None:
+        try:
+            self._spool(payload)
+        except Exception as e:
+            print(f"Webhook n8n descartado: {e}")
+
+    async def _replay_spool(self) -> None:
+        if self.spool_dir is None or not self.spool_dir.is_dir():
+            return
+        spooled = sorted(self.spool_dir.glob("*.json"))
+        if spooled:
+            print(f"Reenviando {len(spooled)} webhooks pendientes")
+        for path in spooled:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            # The file is only removed after a successful delivery.
+            self._enqueue(payload, path, None)
+
+    def snapshot(self) -> dict[str, Any]:
+        delivered = self.metrics["delivered"]
+        return {
+            **self.metrics,
+            "queued": sum(queue.qsize() for queue in self._lanes.values()),
+            "lanes": len(self._lanes),
+            "latency_seconds_avg": (
+                self.metrics["latency_seconds_sum"] / delivered if delivered else None
+            ),
+        }
+
+    async def aclose(self) -> None:
+        self._started = False
+        lanes, self._lanes = self._lanes, {}
+        workers, self._workers = self._workers, {}
+        for worker in workers.values():
+            worker.cancel()
+        await asyncio.gather(*workers.values(), return_exceptions=True)
+        # Anything still queued at shutdown is kept for the next startup.
+        for queue in lanes.values():
+            while not queue.empty():
+                payload, spool_file, future = queue.get_nowait()
+                if spool_file is None:
+                    self._try_spool(payload)
+                if future is not None and not future.done():
+                    future.set_result(False)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ResultStreamer:
+    """
+    Streams per-case results of a job to the webhook in micro-batches of `batch_size`.
+    Batches go through the job's delivery queue in the sender so scraping never waits
+    on the network; `close()` flushes what is left and waits for every batch.
+    """
+
+    def __init__(self, sender: WebhookSender, *, job_id: str, format: str, batch_size: int = 1) -> None:
+        self.sender = sender
+        self.job_id = job_id
+        self.format = format
+        self.batch_size = max(1, batch_size)
+        self.sent_batches = 0
+        self.failed_batches = 0
+        self._buffer: list[dict[str, Any]] = []
+        self._pending: list[asyncio.Future] = []
+
+    def add(self, index: int, status: str, case: Any, result: Any) -> None:
+        self._buffer.append({"index": index, "status": status, "case": case, "result": result})
+        if len(self._buffer) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buffer:
+            self._pending.append(
+                self.sender.deliver(
+                    {
+                        "job_id": self.job_id,
+                        "status": "progress",
+                        "format": self.format,
+                        "items": self._buffer,
+                    }
+                )
+            )
+            self._buffer = []
+
+    async def close(self) -> None:
+        self._flush()
+        pending, self._pending = self._pending, []
+        for delivered in await asyncio.gather(*pending):
+            if delivered:
+                self.sent_batches += 1
+            else:
+                self.failed_batches += 1
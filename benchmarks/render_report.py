@@ -0,0 +1,364 @@
+"""
+Report rendering benchmark: current renderer vs the pre-rewrite baseline.
+
+    python -m benchmarks.render_report [--cases 1000] [--rows 50] [--repeat 3]
+
+Prints the best wall time and the tracemalloc peak of each renderer, and checks
+that both produce the same HTML. The current renderer is measured cold (its
+date / escape caches emptied before every run) and warm (caches kept). The baseline renders the raw portal rows; the
+current path includes building the `Schedule` / `NoData` / `ScheduleError` records
+from those rows, since that work moved out of the renderer. Failed cases are
+rendered as validation errors: the baseline had no other kind.
+"""
+
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from html import escape
+from typing import Any, Mapping
+from zoneinfo import ZoneInfo
+
+from app.email import DEFAULT_TZ, _escape, render_schedule_results_email_html
+from app.records import VALIDATION_ERROR, parse_ddmmyyyy, schedule_from_json
+
+# --- Baseline: verbatim copy of app/email.py before the records/fragments rewrites --
+
+
+def _extract_case_fields(case_wrapper: Mapping[str, Any] | None) -> Mapping[str, Any]:
+    """
+    Cases often arrive wrapped like: {"json": {...fields...}, "pairedItem": {...}}
+    We only need the actual case fields stored in "json".
+    """
+    if not case_wrapper:
+        return {}
+    case_fields = case_wrapper.get("json")
+    if isinstance(case_fields, Mapping):
+        return case_fields
+    # Fallback: if payload isn't wrapped, assume it's already the case dict.
+    return case_wrapper
+
+
+def _parse_ddmmyyyy(value: str, tz: ZoneInfo = DEFAULT_TZ) -> date | None:
+    try:
+        # Expected format from PJUD table: "dd/mm/yyyy"
+        # Date from string is timezone-agnostic; tz exists to keep call-sites consistent.
+        _ = tz
+        return datetime.strptime(value.strip(), "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def _case_meta_line(case_wrapper: Mapping[str, Any] | None) -> str:
+    case_fields = _extract_case_fields(case_wrapper)
+    if not case_fields:
+        return "Sin metadata de caso"
+    labels = {
+        "competency": "Competencia",
+        "court": "Corte",
+        "book": "Libro",
+        "rol": "Rol",
+        "year": "Año",
+    }
+    keys = ("competency", "court", "book", "rol", "year")
+    chunks = [
+        f"{labels.get(k, k)}: {case_fields.get(k)}" for k in keys if case_fields.get(k)
+    ]
+    return " · ".join(chunks) if chunks else "Sin metadata de caso"
+
+
+def _is_no_data_message(schedule: list[list[str]] | None) -> str | None:
+    """
+    PJUD sometimes returns a single-cell row: ["Ningún dato disponible en esta tabla"]
+    If so, return that message to show it nicely; otherwise None.
+    """
+    if not schedule:
+        return None
+    if len(schedule) == 1 and len(schedule[0]) == 1:
+        msg = schedule[0][0] or ""
+        if "Ningún dato disponible" in msg:
+            return msg
+    return None
+
+
+def baseline_render_schedule_results_email_html(
+    schedules: list[list[list[str]] | str],
+    *,
+    cases: list[dict] | None = None,
+) -> str:
+    """
+    Gmail/email-client friendly HTML:
+    - Uses table-based layout (nested tables)
+    - Uses inline styles only (no <style> tag)
+    - Avoids modern CSS features that are inconsistently supported in email clients
+    """
+    now = datetime.now(DEFAULT_TZ)
+    today = now.date()
+    generated_at = now.strftime("%d/%m/%Y %H:%M:%S")
+
+    # Common inline styles
+    page_bg = "background-color:#0b1220;"
+    text = "color:#eaf2ff;"
+    muted = "color:#8aa0bd;"
+    card_bg = "background-color:#0f1b2d;"
+    border = "border:1px solid rgba(255,255,255,0.10);"
+    radius = "border-radius:12px;"
+    font = "font-family:Arial, Helvetica, sans-serif;"
+
+    def badge(label: str, *, variant: str = "neutral") -> str:
+        if variant == "ok":
+            b = "border:1px solid rgba(45,212,191,0.55); background-color:rgba(45,212,191,0.12);"
+        elif variant == "bad":
+            b = "border:1px solid rgba(251,113,133,0.55); background-color:rgba(251,113,133,0.12);"
+        else:
+            b = "border:1px solid rgba(255,255,255,0.12); background-color:rgba(255,255,255,0.06);"
+        return (
+            f'<span style="display:inline-block; padding:6px 10px; border-radius:999px; '
+            f'font-size:12px; {text} {b}">{escape(label)}</span>'
+        )
+
+    parts: list[str] = []
+    parts.append("<!doctype html><html><body>")
+    parts.append(
+        f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" style="{page_bg} {font} {text} padding:0; margin:0;">'
+        '<tr><td align="center" style="padding:24px 12px;">'
+        f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" style="max-width:900px;">'
+        "<tr><td>"
+        f'<div style="font-size:18px; font-weight:700; {text}">Resultados — Programación de Sala</div>'
+        f'<div style="margin-top:6px; font-size:12px; {muted}">Generado: {escape(generated_at)}</div>'
+        f'<div style="margin-top:8px; font-size:12px; {muted}">Se marca como <b style="{text}">FUTURA</b> cualquier fecha mayor a la fecha actual.</div>'
+        "</td></tr>"
+    )
+
+    for idx, schedule in enumerate(schedules, start=1):
+        case_wrapper = cases[idx - 1] if cases and idx - 1 < len(cases) else None
+        meta_line = _case_meta_line(
+            case_wrapper if isinstance(case_wrapper, Mapping) else None
+        )
+
+        is_error = isinstance(schedule, str)
+        rows = []
+        future_rows = 0
+        
+        if not is_error:
+            rows = [r for r in (schedule or []) if r]
+            future_rows = sum(
+                1
+                for r in rows
+                if (parsed := _parse_ddmmyyyy(r[-1] if r else "")) is not None
+                and parsed > today
+            )
+
+        parts.append('<tr><td style="padding-top:14px;">')
+        parts.append(
+            f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" '
+            f'style="{card_bg} {border} {radius} overflow:hidden;">'
+        )
+        # Card head
+        parts.append('<tr><td style="padding:14px 14px 10px;">')
+        parts.append(
+            f'<div style="font-size:14px; font-weight:700; {text}">Caso #{idx}</div>'
+            f'<div style="margin-top:4px; font-size:12px; {muted}">{escape(meta_line)}</div>'
+        )
+        parts.append('<div style="margin-top:10px;">')
+        if is_error:
+            parts.append(badge("Error de validación", variant="bad"))
+        else:
+            parts.append(badge(f"Filas: {len(rows)}", variant="ok"))
+            parts.append("&nbsp;")
+            parts.append(
+                badge(
+                    f"Fechas futuras: {future_rows}",
+                    variant=("bad" if future_rows else "neutral"),
+                )
+            )
+        parts.append("</div>")
+        parts.append("</td></tr>")
+
+        if is_error:
+            parts.append(
+                f'<tr><td style="padding:12px 14px 14px; font-size:13px; color:#fb7185;">'
+                f'<strong>Fallo la validación:</strong> {escape(schedule)}'
+                f'</td></tr>'
+            )
+            parts.append("</table></td></tr>")
+            continue
+
+        if not rows:
+            parts.append(
+                f'<tr><td style="padding:12px 14px 14px; font-size:12px; {muted}">Sin resultados.</td></tr>'
+            )
+            parts.append("</table></td></tr>")
+            continue
+
+        if msg := _is_no_data_message(schedule):
+            parts.append(
+                f'<tr><td style="padding:12px 14px 14px; font-size:12px; {muted}">{escape(msg)}</td></tr>'
+            )
+            parts.append("</table></td></tr>")
+            continue
+
+        # Table of rows (simple, no sticky headers)
+        max_cols = max((len(r) for r in rows), default=0)
+        headers = ["Sala", "Número", "Causa", "Ingreso", "Fecha"]
+        # Keep safe if upstream changes column count:
+        if max_cols and max_cols != len(headers):
+            headers = [f"Columna {i}" for i in range(1, max_cols + 1)]
+            headers[-1] = "Fecha"
+
+        parts.append('<tr><td style="padding:0 14px 14px;">')
+        parts.append(
+            f'<table role="presentation" cellpadding="0" cellspacing="0" width="100%" '
+            f'style="border-collapse:collapse; {border} border-radius:10px;">'
+        )
+        # header row
+        parts.append("<tr>")
+        for h in headers:
+            parts.append(
+                f'<td style="padding:10px 10px; font-size:12px; font-weight:700; {muted} '
+                f'background-color:rgba(255,255,255,0.04); border-bottom:1px solid rgba(255,255,255,0.10);">'
+                f"{escape(h)}</td>"
+            )
+        parts.append("</tr>")
+
+        for r in rows:
+            padded = (r + [""] * max(0, len(headers) - len(r)))[: len(headers)]
+            parsed = _parse_ddmmyyyy(padded[-1]) if padded else None
+            is_future = bool(parsed and parsed > today)
+            row_bg = "background-color:rgba(251,113,133,0.06);" if is_future else ""
+            parts.append(f'<tr style="{row_bg}">')
+            for col_idx, cell in enumerate(padded):
+                if col_idx == len(headers) - 1:
+                    date_style = (
+                        "color:#fb7185; font-weight:700;" if is_future else text
+                    )
+                    fut = ""
+                    if is_future:
+                        fut = (
+                            ' <span style="display:inline-block; margin-left:6px; padding:2px 8px; '
+                            "border-radius:999px; font-size:11px; "
+                            "border:1px solid rgba(251,113,133,0.55); background-color:rgba(251,113,133,0.12); "
+                            f'{text}">FUTURA</span>'
+                        )
+                    parts.append(
+                        f'<td style="padding:10px 10px; font-size:12px; {date_style} '
+                        f'border-bottom:1px solid rgba(255,255,255,0.10); white-space:nowrap;">'
+                        f"{escape(cell)}{fut}</td>"
+                    )
+                else:
+                    parts.append(
+                        f'<td style="padding:10px 10px; font-size:12px; {text} '
+                        f'border-bottom:1px solid rgba(255,255,255,0.10);">'
+                        f"{escape(cell)}</td>"
+                    )
+            parts.append("</tr>")
+
+        parts.append("</table></td></tr>")
+        parts.append("</table></td></tr>")
+
+    parts.append(
+        '<tr><td style="padding-top:16px;">'
+        f'<div style="text-align:center; font-size:12px; {muted}">Automatizador legal · Reporte</div>'
+        "</td></tr></table></td></tr></table>"
+    )
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+# --- Benchmark --------------------------------------------------------------------
+
+
+def make_batch(n_cases: int, n_rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    today = date.today()
+    schedules, cases = [], []
+    for i in range(n_cases):
+        cases.append(
+            {
+                "competency": "Corte Apelaciones",
+                "court": "C.A. de Santiago",
+                "book": "Protección",
+                "rol": str(1000 + i),
+                "year": "2024",
+            }
+        )
+        if i % 100 == 99:
+            schedules.append("Error al obtener el horario de la sala: timeout")
+            continue
+        rows = [
+            [
+                f"Sala {rng.randint(1, 12)}",
+                str(rng.randint(1, 40)),
+                f"Protección-{1000 + i}-2024",
+                "01/03/2024",
+                (today + timedelta(days=rng.randint(-90, 90))).strftime("%d/%m/%Y"),
+            ]
+            for _ in range(n_rows)
+        ]
+        schedules.append(rows)
+    return schedules, cases
+
+
+def current_render(schedules: list[list[list[str]] | str], *, cases: list[dict]) -> str:
+    """The current path: build the records from the rows, then render them."""
+    records = [schedule_from_json(schedule, kind=VALIDATION_ERROR) for schedule in schedules]
+    return render_schedule_results_email_html(records, cases=cases)
+
+
+def _clear_caches() -> None:
+    # Memoized dates and escaped cells only help the current renderer.
+    parse_ddmmyyyy.cache_clear()
+    _escape.cache_clear()
+
+
+def measure(fn, args: tuple, kwargs: dict, repeat: int, *, cold: bool) -> tuple[float, int, str]:
+    """Best time of `repeat` runs and the peak of one more; `cold` empties the caches first."""
+    best = float("inf")
+    for _ in range(repeat):
+        if cold:
+            _clear_caches()
+        started = time.perf_counter()
+        html = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+        del html
+    if cold:
+        _clear_caches()
+    tracemalloc.start()
+    html = fn(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, html
+
+
+_GENERATED = re.compile(r"Generado: [0-9/: ]+")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    schedules, cases = make_batch(args.cases, args.rows)
+    print(f"{args.cases} casos x {args.rows} filas")
+    results = {}
+    # Warm: the caches kept from previous reports, as in a long-running app.
+    for name, fn, cold in (
+        ("baseline", baseline_render_schedule_results_email_html, True),
+        ("current", current_render, True),
+        ("warm", current_render, False),
+    ):
+        seconds, peak, html = measure(fn, (schedules,), {"cases": cases}, args.repeat, cold=cold)
+        results[name] = _GENERATED.sub("", html)
+        print(
+            f"{name:>8}: {seconds * 1000:8.1f} ms  pico {peak / 2**20:7.1f} MiB  "
+            f"html {len(html) / 2**20:6.1f} MiB"
+        )
+    print("HTML idéntico:", results["baseline"] == results["current"])
+
+
+if __name__ == "__main__":
+    main()
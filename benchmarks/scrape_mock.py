@@ -0,0 +1,307 @@
+"""
+Offline scraping benchmark against a local replica of Programación de Sala.
+
+    python -m benchmarks.scrape_mock [--cases 40] [--rows 20] [--latency-ms 150]
+        [--concurrency 2] [--pacing fast] [--direct-fetch] [--empty-ratio 0.1]
+
+Serves a mock of the PJUD home page (focus button, sidebar with the li[16] link,
+progComp / progCorte / progRolCausa / progEraCausa / progTipoCausa form and a
+dtaTableDetalleProgSala result table with `--rows` rows after `--latency-ms`) from a
+local HTTP server, points PJUD_HOME_URL at it and runs `playwright_start_process`
+headless. Prints cases/minute, p50/p95 per-case latency, the stage breakdown and
+memory, plus batch validation and report render times, and checks every case got
+the rows the mock served.
+
+Needs Playwright's Chromium (`playwright install chromium`); no network access.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import resource
+import statistics
+import threading
+import time
+from contextvars import ContextVar
+from datetime import date, timedelta
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from app.email import render_schedule_results_email_html
+from app.pacing import get_pacing_profile
+from app.records import NoData, Schedule
+from app.timing import CURRENT_JOB_TIMINGS, JobTimings
+from app.validation import BOOKS_OPTIONS, COMPETENCY_OPTIONS, COURTS_OPTIONS, validate_cases
+
+_NO_DATA_MESSAGE = "Ningún dato disponible en esta tabla"
+
+# --- Mock portal ----------------------------------------------------------------
+
+_HOME_HTML = """<!doctype html>
+<html lang="es">
+<head><meta charset="utf-8"><title>Oficina Judicial Virtual (mock)</title></head>
+<body>
+<div id="focus"><button type="button">Consulta causas</button></div>
+<div id="sidebar" hidden><ul>{items}</ul></div>
+<div id="content"></div>
+<script>
+document.querySelector("#focus button").addEventListener("click", () => {{
+  document.getElementById("sidebar").hidden = false;
+}});
+document.getElementById("prog-link").addEventListener("click", async (ev) => {{
+  ev.preventDefault();
+  const resp = await fetch("/programacion.php");
+  document.getElementById("content").innerHTML = await resp.text();
+}});
+document.addEventListener("click", async (ev) => {{
+  if (ev.target.id !== "btnProgConsulta") return;
+  const out = document.getElementById("resultado");
+  out.innerHTML = "";
+  const body = new URLSearchParams();
+  for (const id of ["progComp", "progCorte", "progRolCausa", "progEraCausa", "progTipoCausa"]) {{
+    body.append(id, document.getElementById(id).value);
+  }}
+  const resp = await fetch("/consultaProgramacion.php", {{method: "POST", body}});
+  out.innerHTML = await resp.text();
+}});
+</script>
+</body>
+</html>
+"""
+
+
+def _select(field_id: str, labels) -> str:
+    # Numeric option values, like the portal: labels must be mapped to be replayed.
+    options = "".join(
+        f'<option value="{i}">{escape(label)}</option>' for i, label in enumerate(sorted(labels), 1)
+    )
+    return f'<select id="{field_id}"><option value="">Seleccione</option>{options}</select>'
+
+
+def _home_html() -> str:
+    items = [f'<li><a href="#">Opción {n}</a></li>' for n in range(1, 16)]
+    # The scraper clicks //*[@id="sidebar"]/ul/li[16]/a.
+    items.append('<li><a id="prog-link" href="#">Programación de Sala</a></li>')
+    return _HOME_HTML.format(items="".join(items))
+
+
+def _form_html() -> str:
+    return (
+        "<h2>Programación de Sala</h2>"
+        + _select("progComp", COMPETENCY_OPTIONS)
+        + _select("progCorte", COURTS_OPTIONS)
+        + '<input id="progRolCausa" type="text"><input id="progEraCausa" type="text">'
+        + _select("progTipoCausa", BOOKS_OPTIONS)
+        + '<button id="btnProgConsulta" type="button">Consultar</button>'
+        + '<div id="resultado"></div>'
+    )
+
+
+def mock_rows(rol: str, year: str, *, rows: int, empty_ratio: float) -> list[list[str]]:
+    """Deterministic rows for a case, so results can be checked after the run."""
+    digest = hashlib.sha1(f"{rol}|{year}".encode()).digest()
+    if digest[0] / 255 < empty_ratio:
+        return []
+    start = date.today() + timedelta(days=digest[1] % 30)
+    return [
+        [
+            f"Sala {1 + (digest[2] + i) % 12}",
+            str(i + 1),
+            f"C-{rol}-{year}",
+            "01/03/2024",
+            (start + timedelta(days=i)).strftime("%d/%m/%Y"),
+        ]
+        for i in range(rows)
+    ]
+
+
+def _table_html(rows: list[list[str]]) -> str:
+    head = (
+        "<thead><tr><th colspan='5'>Programación de Sala</th></tr>"
+        "<tr><th>Sala</th><th>Número</th><th>Causa</th><th>Ingreso</th><th>Fecha</th></tr></thead>"
+    )
+    if rows:
+        body = "".join(
+            "<tr>" + "".join(f"<td>{escape(cell)}</td>" for cell in row) + "</tr>" for row in rows
+        )
+    else:
+        body = f"<tr><td colspan='5'>{_NO_DATA_MESSAGE}</td></tr>"
+    return f'<table id="dtaTableDetalleProgSala">{head}<tbody>{body}</tbody></table>'
+
+
+def start_mock_portal(*, rows: int, latency: float, empty_ratio: float) -> ThreadingHTTPServer:
+    """Serve the mock on 127.0.0.1 (random port) from a daemon thread."""
+    home = _home_html().encode()
+    form = _form_html().encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body: bytes) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path.startswith("/home/index.php"):
+                self._send(home)
+            elif self.path.startswith("/programacion.php"):
+                self._send(form)
+            else:
+                self.send_error(404)
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            fields = dict(parse_qsl(self.rfile.read(length).decode(), keep_blank_values=True))
+            time.sleep(latency)
+            case_rows = mock_rows(
+                fields.get("progRolCausa", ""),
+                fields.get("progEraCausa", ""),
+                rows=rows,
+                empty_ratio=empty_ratio,
+            )
+            self._send(_table_html(case_rows).encode())
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Benchmark ------------------------------------------------------------------
+
+
+def make_cases(n_cases: int) -> list[dict]:
+    courts = sorted(COURTS_OPTIONS - {"Todos"})
+    cases = []
+    for i in range(n_cases):
+        if i % 2:
+            cases.append({"competency": "Civil", "rol": f"C-{1000 + i}", "year": "2024"})
+        else:
+            cases.append(
+                {
+                    "competency": "Corte Apelaciones",
+                    "court": courts[i % len(courts)],
+                    "book": "Protección",
+                    "rol": str(1000 + i),
+                    "year": "2024",
+                }
+            )
+    return cases
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def run(
+    args: argparse.Namespace, cases: list[dict]
+) -> tuple[list, list[float], JobTimings, float]:
+    # Imported after PJUD_HOME_URL is set: the scraper reads it at import time.
+    from app.automatization import ScrapeStats, playwright_start_process
+
+    # Each worker task has its own context, so this holds the worker's previous finish.
+    last_done: ContextVar[float] = ContextVar("last_done")
+    latencies: list[float] = []
+    started = time.perf_counter()
+
+    async def on_result(index: int, result) -> None:
+        now = time.perf_counter()
+        latencies.append(now - last_done.get(started))
+        last_done.set(now)
+
+    timings = JobTimings()
+    CURRENT_JOB_TIMINGS.set(timings)
+    results = await playwright_start_process(
+        cases,
+        headless=True,
+        concurrency=args.concurrency,
+        direct_fetch=args.direct_fetch,
+        pacing=get_pacing_profile(args.pacing),
+        stats=ScrapeStats(),
+        on_result=on_result,
+    )
+    return results, latencies, timings, time.perf_counter() - started
+
+
+def _matches(result, expected: list[list[str]]) -> bool:
+    if not expected:
+        return isinstance(result, NoData)
+    return isinstance(result, Schedule) and [h.row() for h in result.hearings] == expected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--empty-ratio", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--pacing", default="fast")
+    parser.add_argument("--direct-fetch", action="store_true")
+    args = parser.parse_args()
+
+    server = start_mock_portal(
+        rows=args.rows, latency=args.latency_ms / 1000, empty_ratio=args.empty_ratio
+    )
+    os.environ["PJUD_HOME_URL"] = f"http://127.0.0.1:{server.server_port}/home/index.php"
+    cases = make_cases(args.cases)
+
+    started = time.perf_counter()
+    reports = validate_cases(cases)
+    validation_ms = (time.perf_counter() - started) * 1000
+    # Scrape the normalized copies, like the app does.
+    cases = [report.case for report in reports]
+
+    try:
+        results, latencies, timings, elapsed = asyncio.run(run(args, cases))
+    finally:
+        server.shutdown()
+
+    started = time.perf_counter()
+    html = render_schedule_results_email_html(results, cases=cases)
+    render_ms = (time.perf_counter() - started) * 1000
+
+    ok = sum(
+        _matches(
+            result,
+            mock_rows(case["rol"], case["year"], rows=args.rows, empty_ratio=args.empty_ratio),
+        )
+        for case, result in zip(cases, results)
+    )
+    print(
+        f"{args.cases} casos x {args.rows} filas, latencia {args.latency_ms:g} ms, "
+        f"concurrencia {args.concurrency}, pacing {args.pacing}"
+        + (", direct fetch" if args.direct_fetch else "")
+    )
+    print(f"  casos/minuto: {args.cases / elapsed * 60:8.1f}  ({elapsed:.1f} s)")
+    print(
+        f"  por caso:     p50 {_percentile(latencies, 50) * 1000:7.0f} ms  "
+        f"p95 {_percentile(latencies, 95) * 1000:7.0f} ms"
+    )
+    for stage, values in timings.as_dict().items():
+        print(
+            f"  {stage:<20} x{values['count']:<4} media {values['mean_seconds'] * 1000:7.1f} ms  "
+            f"máx {values['max_seconds'] * 1000:7.1f} ms"
+        )
+    print(f"  validación:   {validation_ms:8.1f} ms")
+    print(f"  render:       {render_ms:8.1f} ms  html {len(html) / 2**10:.0f} KiB")
+    # ru_maxrss is in KiB on Linux; children = the Chromium processes (already closed).
+    print(
+        f"  memoria máx:  python {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10:.0f} MiB  "
+        f"navegador {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 2**10:.0f} MiB"
+    )
+    print(f"  resultados correctos: {ok}/{args.cases}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,15 +10,29 @@ Solution:
 - Run this script on the host to forward 0.0.0.0:9223 -> 127.0.0.1:9222
 - Point the container to http://<HOST_IP>:9223 (HOST header becomes an IP -> allowed)
 
+Modes:
+- async (default): a single asyncio loop pumps every connection with reused buffers
+  (no threads), caps concurrent connections, closes idle ones, and can expose
+  per-connection byte/latency counters as JSON (--stats-port).
+- threads: the original two-threads-per-connection forwarder.
+
 Usage:
   python host_cdp_forward.py --listen-port 9223 --target-port 9222
+  python host_cdp_forward.py --max-connections 64 --idle-timeout 900 --stats-port 9224
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
+import itertools
+import json
 import socket
 import threading
+import time
+from dataclasses import dataclass, field
+
+BUFFER_SIZE = 65536
 
 
 def _pipe(src: socket.socket, dst: socket.socket) -> None:
@@ -41,27 +55,245 @@ def _handle(client: socket.socket, target_host: str, target_port: int) -> None:
     target = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         target.connect((target_host, target_port))
-        threading.Thread(target=_pipe, args=(client, target), daemon=True).start()
-        threading.Thread(target=_pipe, args=(target, client), daemon=True).start()
+        upstream = threading.Thread(target=_pipe, args=(client, target), daemon=True)
+        upstream.start()
+        _pipe(target, client)
+        upstream.join()
     except Exception:
+        pass
+    finally:
+        _close(client)
+        _close(target)
+
+
+def _close(sock: socket.socket) -> None:
+    try:
+        sock.close()
+    except Exception:
+        pass
+
+
+@dataclass
+class _Connection:
+    id: int
+    peer: str
+    opened_at: float = field(default_factory=time.time)
+    # Milliseconds to open the target connection, and from the first client byte to
+    # the first target byte (roughly the first CDP round trip).
+    connect_ms: float | None = None
+    first_byte_ms: float | None = None
+    bytes_up: int = 0  # client -> target
+    bytes_down: int = 0  # target -> client
+    last_activity: float = field(default_factory=time.monotonic)
+    _first_sent: float | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "peer": self.peer,
+            "age_s": round(time.time() - self.opened_at, 1),
+            "idle_s": round(time.monotonic() - self.last_activity, 1),
+            "connect_ms": self.connect_ms,
+            "first_byte_ms": self.first_byte_ms,
+            "bytes_up": self.bytes_up,
+            "bytes_down": self.bytes_down,
+        }
+
+
+class AsyncForwarder:
+    """
+    Single-threaded forwarder: every connection is two coroutines copying with
+    `sock_recv_into` / `sock_sendall` into buffers taken from a shared free list,
+    so memory stays flat however many pages the app opens.
+
+    At most `max_connections` are forwarded at once (further clients wait in the
+    listen backlog); a connection with no traffic in either direction for
+    `idle_timeout` seconds is closed (0 disables it: the app keeps its CDP
+    connection open, and silent, between jobs).
+    """
+
+    def __init__(
+        self,
+        listen_host: str,
+        listen_port: int,
+        target_host: str,
+        target_port: int,
+        *,
+        max_connections: int = 256,
+        idle_timeout: float = 0,
+        buffer_size: int = BUFFER_SIZE,
+    ) -> None:
+        self.listen = (listen_host, listen_port)
+        self.target = (target_host, target_port)
+        self.max_connections = max(1, max_connections)
+        self.idle_timeout = idle_timeout
+        self.buffer_size = buffer_size
+        self.connections: dict[int, _Connection] = {}
+        self.totals = {
+            "accepted": 0,
+            "closed": 0,
+            "target_errors": 0,
+            "idle_closed": 0,
+            "bytes_up": 0,
+            "bytes_down": 0,
+        }
+        self._ids = itertools.count(1)
+        self._buffers: list[bytearray] = []
+        self._slots: asyncio.Semaphore | None = None
+
+    def _take_buffer(self) -> bytearray:
+        return self._buffers.pop() if self._buffers else bytearray(self.buffer_size)
+
+    async def _pump(
+        self, src: socket.socket, dst: socket.socket, conn: _Connection, upstream: bool
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        buffer = self._take_buffer()
+        view = memoryview(buffer)
         try:
-            client.close()
-        except Exception:
+            while True:
+                n = await loop.sock_recv_into(src, buffer)
+                if not n:
+                    break
+                now = time.monotonic()
+                conn.last_activity = now
+                if upstream:
+                    if conn._first_sent is None:
+                        conn._first_sent = now
+                    conn.bytes_up += n
+                    self.totals["bytes_up"] += n
+                else:
+                    if conn.first_byte_ms is None and conn._first_sent is not None:
+                        conn.first_byte_ms = round((now - conn._first_sent) * 1000, 2)
+                    conn.bytes_down += n
+                    self.totals["bytes_down"] += n
+                await loop.sock_sendall(dst, view[:n])
+        except OSError:
             pass
+        finally:
+            view.release()
+            self._buffers.append(buffer)
+            # Half-close: the other direction may still be sending.
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    async def _watch_idle(self, pumps: asyncio.Future, conn: _Connection) -> bool:
+        """Cancel `pumps` once the connection has been idle too long (True if it did)."""
+        while not pumps.done():
+            remaining = conn.last_activity + self.idle_timeout - time.monotonic()
+            if remaining <= 0:
+                self.totals["idle_closed"] += 1
+                pumps.cancel()
+                return True
+            await asyncio.wait({pumps}, timeout=remaining)
+        return False
+
+    async def _handle(self, client: socket.socket, peer: str) -> None:
+        loop = asyncio.get_running_loop()
+        conn = _Connection(next(self._ids), peer)
+        self.connections[conn.id] = conn
+        target = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        target.setblocking(False)
         try:
-            target.close()
-        except Exception:
+            started = time.monotonic()
+            try:
+                await loop.sock_connect(target, self.target)
+            except OSError as e:
+                self.totals["target_errors"] += 1
+                print(f"[forwarder] No se pudo conectar a {self.target}: {e}", flush=True)
+                return
+            conn.connect_ms = round((time.monotonic() - started) * 1000, 2)
+            for sock in (client, target):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            pumps = asyncio.gather(
+                self._pump(client, target, conn, upstream=True),
+                self._pump(target, client, conn, upstream=False),
+            )
+            idle = self.idle_timeout > 0 and await self._watch_idle(pumps, conn)
+            try:
+                await pumps
+            except asyncio.CancelledError:
+                if not idle:
+                    raise
+        finally:
+            _close(client)
+            _close(target)
+            del self.connections[conn.id]
+            self.totals["closed"] += 1
+            self._slots.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "listen": f"{self.listen[0]}:{self.listen[1]}",
+            "target": f"{self.target[0]}:{self.target[1]}",
+            "max_connections": self.max_connections,
+            "idle_timeout_s": self.idle_timeout,
+            "active": len(self.connections),
+            "pooled_buffers": len(self._buffers),
+            **self.totals,
+            "connections": [conn.as_dict() for conn in self.connections.values()],
+        }
+
+    async def _serve_stats(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Minimal HTTP: any request gets the JSON snapshot.
+        try:
+            await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
             pass
+        body = json.dumps(self.snapshot()).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
 
+    async def serve(self, stats_host: str | None = None, stats_port: int = 0) -> None:
+        loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_connections)
+        server = _listening_socket(*self.listen)
+        server.setblocking(False)
+        stats = None
+        if stats_port:
+            stats = await asyncio.start_server(
+                self._serve_stats, stats_host or self.listen[0], stats_port
+            )
+        print(
+            f"Forwarding {self.listen[0]}:{self.listen[1]} -> {self.target[0]}:{self.target[1]}"
+            f" (async, max {self.max_connections} conexiones)",
+            flush=True,
+        )
+        if stats:
+            print(f"Stats en http://{stats_host or self.listen[0]}:{stats_port}/", flush=True)
+        tasks: set[asyncio.Task] = set()
+        try:
+            while True:
+                await self._slots.acquire()
+                try:
+                    client, addr = await loop.sock_accept(server)
+                except BaseException:
+                    self._slots.release()
+                    raise
+                client.setblocking(False)
+                self.totals["accepted"] += 1
+                task = asyncio.create_task(self._handle(client, f"{addr[0]}:{addr[1]}"))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if stats:
+                stats.close()
+            server.close()
 
-def run_forwarder(listen_port: int = 9223, target_port: int = 9222, listen_host: str = "0.0.0.0", target_host: str = "127.0.0.1") -> None:
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--listen-host", default=listen_host)
-    ap.add_argument("--listen-port", type=int, default=listen_port)
-    ap.add_argument("--target-host", default=target_host)
-    ap.add_argument("--target-port", type=int, default=target_port)
-    args = ap.parse_args()
 
+def _listening_socket(host: str, port: int) -> socket.socket:
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
@@ -69,8 +301,42 @@ def run_forwarder(listen_port: int = 9223, target_port: int = 9222, listen_host:
         server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     except AttributeError:
         pass
-    server.bind((args.listen_host, args.listen_port))
+    server.bind((host, port))
     server.listen(64)
+    return server
+
+
+def run_forwarder(listen_port: int = 9223, target_port: int = 9222, listen_host: str = "0.0.0.0", target_host: str = "127.0.0.1") -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--listen-host", default=listen_host)
+    ap.add_argument("--listen-port", type=int, default=listen_port)
+    ap.add_argument("--target-host", default=target_host)
+    ap.add_argument("--target-port", type=int, default=target_port)
+    ap.add_argument("--mode", choices=("async", "threads"), default="async")
+    ap.add_argument("--max-connections", type=int, default=256)
+    ap.add_argument(
+        "--idle-timeout", type=float, default=0, help="Segundos sin tráfico antes de cerrar (0 = nunca)"
+    )
+    ap.add_argument("--stats-host", default="127.0.0.1")
+    ap.add_argument("--stats-port", type=int, default=0, help="Puerto HTTP de estadísticas (0 = desactivado)")
+    args = ap.parse_args()
+
+    if args.mode == "async":
+        forwarder = AsyncForwarder(
+            args.listen_host,
+            args.listen_port,
+            args.target_host,
+            args.target_port,
+            max_connections=args.max_connections,
+            idle_timeout=args.idle_timeout,
+        )
+        try:
+            asyncio.run(forwarder.serve(args.stats_host, args.stats_port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    server = _listening_socket(args.listen_host, args.listen_port)
     print(
         f"Forwarding {args.listen_host}:{args.listen_port} -> {args.target_host}:{args.target_port}",
         flush=True,
@@ -83,3 +349,7 @@ def run_forwarder(listen_port: int = 9223, target_port: int = 9222, listen_host:
             args=(client, args.target_host, args.target_port),
             daemon=True,
         ).start()
+
+
+if __name__ == "__main__":
+    run_forwarder()
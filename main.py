@@ -1,127 +1,612 @@
-import os
 import asyncio
+import os
+import shutil
 import uuid
-from typing import Any
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Iterator
 
-import httpx
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, UploadFile
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from app.automatization import playwright_start_process
-from app.email import process_schedule_results
-from app.process_excel import validate_row_data
-
-app = FastAPI()
+from app.automatization import SCRAPE_ERROR_MESSAGE, ScrapeStats, playwright_start_process
+from app.browser_pool import BrowserPool, ShardedBrowserPool, parse_shards
+from app.cache import ScheduleCache, case_key
+from app.changes import ScheduleDiff, ScheduleHistory
+from app.coalesce import InFlightCases
+from app.jobs import (
+    CASE_DONE,
+    CASE_FAILED,
+    CASE_INVALID,
+    CASE_PENDING,
+    COMPLETED,
+    FAILED,
+    PARTIAL,
+    JobScheduler,
+    JobStore,
+)
+from app.pacing import PacingProfile, get_pacing_profile
+from app.records import (
+    SCRAPE_ERROR,
+    VALIDATION_ERROR,
+    ScheduleError,
+    ScheduleResult,
+    schedule_from_json,
+    schedule_to_json,
+)
+from app.validation import validate_case
+from app.email import iter_schedule_results_email_html, process_schedule_results
+from app.exports import EXPORT_FORMATS
+from app.process_excel import stream_case_rows
+from app.timing import CURRENT_JOB_TIMINGS, STAGE_TIMINGS, JobTimings, timed
+from app.webhook import ResultStreamer, WebhookSender
 
 N8N_WEBHOOK_URL = os.getenv(
     "N8N_WEBHOOK_URL",
     "https://n8n.ghurtadodev.cl/webhook/7e84ffba-5315-43f3-bc46-a645f96bb786",
 )
+# Number of pages scraping in parallel on the shared browser (overridable per request).
+SCRAPER_CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", "1"))
+# Highest ?concurrency= a job may ask for; the browser pool gets this many pages.
+SCRAPER_MAX_CONCURRENCY = max(
+    SCRAPER_CONCURRENCY, int(os.getenv("SCRAPER_MAX_CONCURRENCY", "4"))
+)
+# Replay the consulta XHR over HTTP instead of driving the form for every case.
+SCRAPER_DIRECT_FETCH = os.getenv("SCRAPER_DIRECT_FETCH", "1") == "1"
+# "bulk" reads the results table in one page.evaluate; "cells" keeps the per-cell locators.
+SCRAPER_EXTRACTION = os.getenv("SCRAPER_EXTRACTION", "bulk")
+# Default pacing profile: "stealth", "balanced" or "fast" (see app/pacing.py).
+SCRAPER_PACING = os.getenv("SCRAPER_PACING", "stealth")
+# Retries per failing case (each one reloads the Programación de Sala screen first).
+SCRAPER_RETRIES = int(os.getenv("SCRAPER_RETRIES", "2"))
+# In CDP mode a captcha waits this long for someone to solve it in the host browser.
+SCRAPER_CAPTCHA_WAIT = float(os.getenv("SCRAPER_CAPTCHA_WAIT", "120"))
+# Cases are scraped grouped by (competency, court, book) within windows of this size,
+# so the form selects are only changed when needed (0 keeps the input order).
+SCRAPER_PLAN_WINDOW = int(os.getenv("SCRAPER_PLAN_WINDOW", "100"))
+
+# Schedules scraped less than SCHEDULE_CACHE_TTL_HOURS ago are served from disk (0 disables).
+SCHEDULE_CACHE = ScheduleCache(
+    os.getenv("SCHEDULE_CACHE_PATH", "data/schedule_cache.sqlite3"),
+    ttl_seconds=float(os.getenv("SCHEDULE_CACHE_TTL_HOURS", "12")) * 3600,
+    max_entries=int(os.getenv("SCHEDULE_CACHE_MAX_ENTRIES", "5000")),
+)
+# Last known rows per case, to report new / removed / rescheduled hearings.
+SCHEDULE_HISTORY = ScheduleHistory(
+    os.getenv("SCHEDULE_HISTORY_PATH", "data/schedule_history.sqlite3")
+)
+
+# Long-lived browser whose pages stay parked on Programación de Sala between jobs.
+# BROWSER_POOL=0 opens (and closes) a browser per job instead.
+# BROWSER_SHARDS="http://10.0.0.2:9223=3,local=2" spreads cases across several
+# browsers (CDP endpoints and/or local Chromium), each with its own page limit.
+BROWSER_SHARDS = os.getenv("BROWSER_SHARDS", "").strip()
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", str(SCRAPER_MAX_CONCURRENCY)))
+BROWSER_POOL_MAX_USES = int(os.getenv("BROWSER_POOL_MAX_USES", "50"))
+if os.getenv("BROWSER_POOL", "1") != "1":
+    BROWSER_POOL = None
+elif BROWSER_SHARDS:
+    BROWSER_POOL = ShardedBrowserPool(
+        parse_shards(BROWSER_SHARDS, default_size=BROWSER_POOL_SIZE),
+        max_uses=BROWSER_POOL_MAX_USES,
+        pacing=get_pacing_profile(SCRAPER_PACING),
+        cooldown=float(os.getenv("BROWSER_SHARD_COOLDOWN", "30")),
+    )
+else:
+    BROWSER_POOL = BrowserPool(
+        cdp_url=os.getenv("PLAYWRIGHT_CDP_URL"),
+        headless=False,  # ignored when using CDP
+        size=BROWSER_POOL_SIZE,
+        max_uses=BROWSER_POOL_MAX_USES,
+        pacing=get_pacing_profile(SCRAPER_PACING),
+    )
+
+# Jobs are persisted so a restart resumes them; JOB_CONCURRENCY jobs run at a time.
+JOB_STORE = JobStore(os.getenv("JOBS_DB_PATH", "data/jobs.sqlite3"))
+# Identical cases of concurrent jobs share a single browser query.
+IN_FLIGHT = InFlightCases()
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "1"))
+# Values of the `format` query parameter (see GET /jobs/{job_id}/export).
+REPORT_FORMATS = ("html", *EXPORT_FORMATS)
+# Base URL of this API as seen by n8n / email readers, used for report links.
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
+# Sheets received on POST /upload, kept until their job ends.
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "data/uploads"))
 
 
 class Cases(BaseModel):
     cases: list[dict]
 
 
-async def _post_to_n8n_webhook(payload: dict[str, Any]) -> None:
-    timeout = httpx.Timeout(connect=10.0, read=60.0, write=30.0, pool=10.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.post(N8N_WEBHOOK_URL, json=payload)
-        resp.raise_for_status()
+# App-lifetime webhook client; undeliverable payloads are spooled to disk and replayed on startup.
+WEBHOOK = WebhookSender(
+    N8N_WEBHOOK_URL,
+    spool_dir=os.getenv("WEBHOOK_SPOOL_DIR", "data/webhook_spool"),
+    max_attempts=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5")),
+)
+
+
+@timed("webhook_delivery")
+async def _post_to_n8n_webhook(payload: dict[str, Any]) -> bool:
+    """Queue the payload for delivery; False means it was moved to the dead-letter spool."""
+    return await WEBHOOK.deliver(payload)
+
+
+def _case_fields(case_wrapper: Any) -> Any:
+    # Handle potential wrapping as seen in app/email.py _extract_case_fields
+    return case_wrapper.get("json", case_wrapper) if isinstance(case_wrapper, dict) else case_wrapper
+
+
+def _results_json(results: list[ScheduleResult | None]) -> list[dict[str, Any] | None]:
+    return [result.as_dict() if result is not None else None for result in results]
+
+
+def _stored_results(job_id: str) -> Iterator[tuple[int, Any, str, ScheduleResult]]:
+    """Finished cases of a job as records (blocking; see JobStore.iter_case_results)."""
+    for idx, case, status, result in JOB_STORE.iter_case_results(job_id):
+        kind = VALIDATION_ERROR if status == CASE_INVALID else SCRAPE_ERROR
+        yield idx, case, status, schedule_from_json(result, kind=kind)
 
 
-async def _process_cases_and_notify(*, job_id: str, parsed_cases: list[dict], format: str) -> None:
-    all_results: list[Any] = []
-    valid_cases: list[dict] = []
+async def _iter_job_cases(
+    parsed_cases: list[dict], source: str | None
+) -> AsyncIterator[dict]:
+    if source is None:
+        for case_wrapper in parsed_cases:
+            yield case_wrapper
+        return
+    # Uploaded file: rows are parsed while the first cases are already being scraped.
+    async for case in stream_case_rows(source):
+        parsed_cases.append(case)
+        yield case
+
+
+async def _process_cases_and_notify(
+    *,
+    job_id: str,
+    parsed_cases: list[dict],
+    format: str,
+    concurrency: int,
+    direct_fetch: bool,
+    force_refresh: bool,
+    pacing: PacingProfile,
+    stream: bool = False,
+    stream_batch: int = 1,
+    changes_only: bool = False,
+    report_link: bool = False,
+    source: str | None = None,
+) -> None:
+    if source is not None:
+        parsed_cases = []
+    all_results: list[ScheduleResult | None] = []
+    statuses: list[str] = []
+    # Streaming mode posts each result (or micro-batch) as soon as it is known.
+    streamer = (
+        ResultStreamer(WEBHOOK, job_id=job_id, format=format, batch_size=stream_batch)
+        if stream
+        else None
+    )
+
+    def record(idx: int, status: str, result: ScheduleResult) -> None:
+        all_results[idx] = result
+        statuses[idx] = status
+        if streamer is not None:
+            streamer.add(idx, status, parsed_cases[idx], result.as_dict())
+
+    stats = ScrapeStats()
+    # Stage spans (browser connect, navigation, form, table, render, webhook) of this job.
+    timings = JobTimings()
+    cache_stats = {"hits": 0, "misses": 0}
+    # Per-row validation report: index -> [{"field", "code", "message"}, ...]
+    validation: dict[int, list[dict[str, str]]] = {}
+    corrected: dict[int, dict[str, str]] = {}
+    valid_keys: list[tuple] = []
     case_indices: list[int] = []
+    # Keys this job scrapes on behalf of every duplicate (in this or other jobs).
+    owned: dict[tuple, asyncio.Future] = {}
+    followers: list[asyncio.Task] = []
+    dedup_stats = {"in_job": 0, "cross_job": 0}
 
-    for i, case_wrapper in enumerate(parsed_cases):
-        # Handle potential wrapping as seen in app/email.py _extract_case_fields
-        case_fields = (
-            case_wrapper.get("json", case_wrapper) if isinstance(case_wrapper, dict) else case_wrapper
-        )
+    # Cases already finished before a restart are not scraped again.
+    checkpoint = await JOB_STORE.case_results(job_id)
+    resumed = 0
 
-        try:
-            validate_row_data(
-                competency=case_fields.get("competency"),
-                rol=case_fields.get("rol"),
-                year=case_fields.get("year"),
-                court=case_fields.get("court"),
-                book=case_fields.get("book"),
-            )
-            all_results.append(None)  # Placeholder
-            valid_cases.append(case_wrapper)
+    async def cases_to_scrape() -> AsyncIterator[dict]:
+        """Resolve resumed, invalid and cached cases; yield only those that need the browser."""
+        nonlocal resumed
+        i = -1
+        async for case_wrapper in _iter_job_cases(parsed_cases, source):
+            i += 1
+            all_results.append(None)
+            statuses.append(CASE_PENDING)
+            if i in checkpoint and checkpoint[i][0] == CASE_DONE:
+                record(i, CASE_DONE, schedule_from_json(checkpoint[i][1]))
+                resumed += 1
+                continue
+
+            case_fields = _case_fields(case_wrapper)
+
+            report = validate_case(case_fields, i)
+            if not report.valid:
+                validation[i] = [error.as_dict() for error in report.errors]
+                record(i, CASE_INVALID, ScheduleError(report.message, VALIDATION_ERROR))
+                await JOB_STORE.save_case(job_id, i, CASE_INVALID, report.message)
+                continue
+            if report.corrected:
+                corrected[i] = report.corrected
+            # Scrape with the form labels ("Chillán" -> "C.A. de Chillan"), from the
+            # validated copy: the job's cases stay as the user sent them.
+            scrape_case = report.case
+
+            key = case_key(scrape_case)
+            if not force_refresh:
+                cached = await SCHEDULE_CACHE.get_many([key])
+                if key in cached:
+                    cache_stats["hits"] += 1
+                    record(i, CASE_DONE, cached[key])
+                    await JOB_STORE.save_case(
+                        job_id, i, CASE_DONE, schedule_to_json(cached[key])
+                    )
+                    continue
+
+            cache_stats["misses"] += 1
+            # A key this job owns stays coalesced after its result was published.
+            if key in owned:
+                dedup_stats["in_job"] += 1
+                followers.append(asyncio.create_task(follow(i, owned[key])))
+                continue
+            shared, owner = IN_FLIGHT.acquire(key)
+            if not owner:
+                dedup_stats["cross_job"] += 1
+                followers.append(asyncio.create_task(follow(i, shared)))
+                continue
+            owned[key] = shared
+            valid_keys.append(key)
             case_indices.append(i)
-        except ValueError as e:
-            all_results.append(str(e))
+            yield scrape_case
+
+    async def save_result(idx: int, result: ScheduleResult) -> None:
+        record(idx, CASE_FAILED if isinstance(result, ScheduleError) else CASE_DONE, result)
+        await JOB_STORE.save_case(job_id, idx, statuses[idx], schedule_to_json(result))
+
+    async def follow(idx: int, shared: asyncio.Future) -> None:
+        # shield: a cancelled follower must not cancel the owner's future.
+        await save_result(idx, await asyncio.shield(shared))
+
+    async def checkpoint_result(position: int, result: ScheduleResult) -> None:
+        key = valid_keys[position]
+        # Cached before the key leaves IN_FLIGHT, so other jobs hit the cache instead.
+        if not isinstance(result, ScheduleError):
+            await SCHEDULE_CACHE.put_many([(key, result)])
+        IN_FLIGHT.resolve(key, owned[key], result)
+        await save_result(case_indices[position], result)
 
+    timings_token = CURRENT_JOB_TIMINGS.set(timings)
     try:
-        if valid_cases:
-            print(f"[{job_id}] Iniciando proceso para {len(valid_cases)} casos válidos")
-            cdp_url = os.getenv("PLAYWRIGHT_CDP_URL")
-            schedule_results = await playwright_start_process(
-                valid_cases,
-                headless=False,  # ignored when using CDP
-                cdp_url=cdp_url,
-            )
+        print(f"[{job_id}] Iniciando proceso")
+        cdp_url = os.getenv("PLAYWRIGHT_CDP_URL")
+        # The browser is only leased/launched once a case actually needs scraping.
+        schedule_results = await playwright_start_process(
+            cases_to_scrape(),
+            headless=False,  # ignored when using CDP
+            cdp_url=cdp_url,
+            pool=BROWSER_POOL,
+            concurrency=concurrency,
+            direct_fetch=direct_fetch,
+            extraction=SCRAPER_EXTRACTION,
+            pacing=pacing,
+            retries=SCRAPER_RETRIES,
+            captcha_wait=SCRAPER_CAPTCHA_WAIT,
+            plan_window=SCRAPER_PLAN_WINDOW,
+            stats=stats,
+            on_result=checkpoint_result,
+        )
+        # Duplicates get the owner's result (possibly from another job).
+        await asyncio.gather(*followers)
+        if resumed:
+            print(f"[{job_id}] Job reanudado: {resumed} casos ya completados")
+        if source is not None:
+            await JOB_STORE.set_cases(job_id, parsed_cases)
 
-            for idx, result in zip(case_indices, schedule_results or []):
-                all_results[idx] = result
+        for idx, result in zip(case_indices, schedule_results or []):
+            all_results[idx] = result
 
-        html = process_schedule_results(all_results, cases=parsed_cases)
+        # Compare every schedule with the previous run of the same case.
+        done = [idx for idx, status in enumerate(statuses) if status == CASE_DONE]
+        diffs = await SCHEDULE_HISTORY.compare_and_store(
+            [
+                (case_key(validate_case(_case_fields(parsed_cases[idx])).case), all_results[idx])
+                for idx in done
+            ]
+        )
+        changes: list[ScheduleDiff | None] = [None] * len(statuses)
+        for idx, diff in zip(done, diffs):
+            changes[idx] = diff
+        # Changes-only mode skips unchanged cases; errors are always reported.
+        shown = [
+            idx
+            for idx, status in enumerate(statuses)
+            if not changes_only or status != CASE_DONE or changes[idx].changed
+        ]
 
-        await _post_to_n8n_webhook(
-            {
-                "job_id": job_id,
-                "status": "completed",
-                "format": format,
-                "cases": parsed_cases,
-                "results": all_results,
-                "html": html,
+        # The webhook carries the requested format only: the HTML report or the export.
+        # With report_link it gets the URLs to the streamed report / export instead.
+        html = export = None
+        if not report_link and format == "html":
+            html = process_schedule_results(
+                [all_results[idx] for idx in shown],
+                cases=[parsed_cases[idx] for idx in shown],
+                numbers=[idx + 1 for idx in shown],
+                changes=[changes[idx] for idx in shown],
+            )
+        elif not report_link:
+            writer, _ = EXPORT_FORMATS[format]
+            export = "".join(
+                writer((idx, parsed_cases[idx], statuses[idx], all_results[idx]) for idx in shown)
+            )
+        job_status = PARTIAL if CASE_FAILED in statuses else COMPLETED
+
+        payload = {
+            "job_id": job_id,
+            "status": job_status,
+            "format": format,
+            "cases": parsed_cases,
+            "results": _results_json(all_results),
+            "case_status": statuses,
+            "html": html,
+            "export": export,
+            "report_url": f"{PUBLIC_BASE_URL}/jobs/{job_id}/report",
+            "export_url": f"{PUBLIC_BASE_URL}/jobs/{job_id}/export",
+            "throughput": stats.as_dict(),
+            # The delivery of this payload itself only shows up in GET /metrics.
+            "timings": timings.as_dict(),
+            "cache": cache_stats,
+            "validation": {"errors": validation, "corrected": corrected},
+            "dedup": {**dedup_stats, "avoided_scrapes": sum(dedup_stats.values())},
+            "changes": {
+                idx: diff.summary() for idx, diff in enumerate(changes) if diff and diff.changed
+            },
+        }
+        if changes_only:
+            for name in ("cases", "results", "case_status"):
+                del payload[name]
+            payload["changed_cases"] = [
+                {
+                    "index": idx,
+                    "case": parsed_cases[idx],
+                    "status": statuses[idx],
+                    "result": all_results[idx].as_dict(),
+                    "diff": changes[idx].as_dict() if changes[idx] else None,
+                }
+                for idx in shown
+            ]
+            payload["unchanged"] = len(statuses) - len(shown)
+        if streamer is not None:
+            await streamer.close()
+            # Cases and results were already streamed; the final message is a summary.
+            payload.pop("cases", None)
+            payload.pop("results", None)
+            payload["summary"] = {
+                status: statuses.count(status)
+                for status in (CASE_DONE, CASE_INVALID, CASE_FAILED)
             }
-        )
-        print(f"[{job_id}] Webhook n8n enviado OK")
+            payload["streamed_batches"] = streamer.sent_batches
+            payload["failed_batches"] = streamer.failed_batches
+        delivered = await _post_to_n8n_webhook(payload)
+        await JOB_STORE.finish(job_id, job_status)
+        if delivered:
+            print(f"[{job_id}] Webhook n8n enviado OK")
+        else:
+            print(f"[{job_id}] Webhook n8n guardado para reenvío")
     except Exception as e:
+        await JOB_STORE.finish(job_id, FAILED, str(e))
+        if streamer is not None:
+            await streamer.close()
         # Best-effort error notification
         try:
-            await _post_to_n8n_webhook(
+            delivered = await _post_to_n8n_webhook(
                 {
                     "job_id": job_id,
                     "status": "failed",
                     "format": format,
                     "cases": parsed_cases,
                     "error": str(e),
-                    "results": all_results,
+                    "results": _results_json(all_results),
+                    "case_status": statuses,
+                    "timings": timings.as_dict(),
                 }
             )
-            print(f"[{job_id}] Webhook n8n enviado con ERROR")
+            if delivered:
+                print(f"[{job_id}] Webhook n8n enviado con ERROR")
         except Exception as notify_err:
             print(f"[{job_id}] Falló notificación a n8n: {notify_err}")
         print(f"[{job_id}] Error en proceso: {e}")
+    finally:
+        # Never leave other jobs waiting on a query this job will not finish.
+        for key, shared in owned.items():
+            IN_FLIGHT.resolve(
+                key, shared, ScheduleError(f"{SCRAPE_ERROR_MESSAGE}: consulta interrumpida")
+            )
+        for task in followers:
+            task.cancel()
+        CURRENT_JOB_TIMINGS.reset(timings_token)
+    if source is not None:
+        Path(source).unlink(missing_ok=True)
+
+
+async def _run_job(job: dict[str, Any]) -> None:
+    params = dict(job["params"])
+    params["pacing"] = get_pacing_profile(params["pacing"])
+    await _process_cases_and_notify(job_id=job["job_id"], parsed_cases=job["cases"], **params)
+
+
+JOB_SCHEDULER = JobScheduler(JOB_STORE, _run_job, concurrency=JOB_CONCURRENCY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    requeued = await JOB_STORE.requeue_interrupted()
+    if requeued:
+        print(f"Reencolados {requeued} jobs interrumpidos")
+    await WEBHOOK.start()
+    if BROWSER_POOL is not None:
+        BROWSER_POOL.start()
+    JOB_SCHEDULER.start()
+    yield
+    await JOB_SCHEDULER.stop()
+    if BROWSER_POOL is not None:
+        await BROWSER_POOL.close()
+    await WEBHOOK.aclose()
 
 
-def _swallow_task_exception(task: asyncio.Task) -> None:
+app = FastAPI(lifespan=lifespan)
+
+
+@dataclass
+class JobOptions:
+    """Query parameters shared by every endpoint that queues a job."""
+
+    # The webhook gets the report in this format (html keeps the n8n email flow working).
+    format: str = "html"
+    concurrency: int | None = None
+    direct_fetch: bool | None = None
+    force_refresh: bool = False
+    pacing: str | None = None
+    priority: int = 0
+    stream: bool = False
+    stream_batch: int = 1
+    changes_only: bool = False
+    report_link: bool = False
+
+
+async def _queue_job(
+    parsed_cases: list[dict], options: JobOptions, *, job_id: str | None = None, source: str | None = None
+) -> dict[str, Any]:
+    pacing = options.pacing or SCRAPER_PACING
     try:
-        task.exception()
-    except asyncio.CancelledError:
-        return
+        get_pacing_profile(pacing)
+    except ValueError as e:
+        return {"error": str(e)}
+    if options.format not in REPORT_FORMATS:
+        return {"error": f"Format {options.format} is not valid"}
+    concurrency = options.concurrency or SCRAPER_CONCURRENCY
+    if concurrency < 1:
+        return {"error": f"Concurrency {concurrency} is not valid"}
+    # More workers than pages would just wait for a page; report what the job really gets.
+    concurrency = min(
+        concurrency, BROWSER_POOL.size if BROWSER_POOL is not None else SCRAPER_MAX_CONCURRENCY
+    )
+
+    job_id = job_id or str(uuid.uuid4())
+    params = {
+        "format": options.format,
+        "concurrency": concurrency,
+        "direct_fetch": (
+            SCRAPER_DIRECT_FETCH if options.direct_fetch is None else options.direct_fetch
+        ),
+        "force_refresh": options.force_refresh,
+        "pacing": pacing,
+        "stream": options.stream,
+        "stream_batch": options.stream_batch,
+        "changes_only": options.changes_only,
+        "report_link": options.report_link,
+    }
+    if source is not None:
+        params["source"] = source
+    await JOB_STORE.create(job_id, parsed_cases, params, priority=options.priority)
+    JOB_SCHEDULER.notify()
+
+    return {
+        "message": "Se está procesando la información",
+        "job_id": job_id,
+        "concurrency": concurrency,
+    }
 
 
 @app.post("/", status_code=202)
-async def root(cases: Cases, format: str = "json"):
+async def root(cases: Cases, options: JobOptions = Depends()):
     parsed_cases = cases.cases
     if not parsed_cases:
         return {"error": "No cases found"}
+    return await _queue_job(parsed_cases, options)
+
+
+def _save_upload(src: BinaryIO, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    with dst.open("wb") as fh:
+        shutil.copyfileobj(src, fh, length=1024 * 1024)
 
+
+@app.post("/upload", status_code=202)
+async def upload(file: UploadFile, options: JobOptions = Depends()):
+    """Queue a job straight from an .xlsx/.csv sheet (columns: competency, rol, year, court, book)."""
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in (".xlsx", ".csv"):
+        return {"error": f"File type {suffix or '(none)'} is not supported"}
     job_id = str(uuid.uuid4())
+    # The upload is kept on disk until the job ends so an interrupted job can re-read it.
+    path = UPLOAD_DIR / f"{job_id}{suffix}"
+    await asyncio.to_thread(_save_upload, file.file, path)
+    return await _queue_job([], options, job_id=job_id, source=str(path))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await JOB_STORE.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/report", response_class=HTMLResponse)
+async def job_report(job_id: str):
+    """HTML report of the finished cases of a job, streamed case by case."""
+    if await JOB_STORE.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    items = ((idx + 1, result, case, None) for idx, case, _, result in _stored_results(job_id))
+    # Sync generator: Starlette iterates it in a worker thread (sqlite reads block).
+    return StreamingResponse(iter_schedule_results_email_html(items), media_type="text/html")
 
-    task = asyncio.create_task(
-        _process_cases_and_notify(job_id=job_id, parsed_cases=parsed_cases, format=format)
+
+@app.get("/jobs/{job_id}/export")
+async def job_export(job_id: str, format: str | None = None):
+    """Finished cases of a job in `format` (default: the format requested for the job)."""
+    job = await JOB_STORE.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    format = format or job["params"].get("format", "html")
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format {format} is not valid")
+    if format == "html":
+        return await job_report(job_id)
+    writer, media_type = EXPORT_FORMATS[format]
+    extension = "ndjson" if format == "columnar" else format
+    return StreamingResponse(
+        writer(_stored_results(job_id)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{job_id}.{extension}"'},
     )
-    # Avoid "Task exception was never retrieved" warnings
-    task.add_done_callback(_swallow_task_exception)
 
-    return {
-        "message": "Se está procesando la información",
-        "job_id": job_id,
-    }
+
+@app.get("/browser/pool")
+async def browser_pool_status():
+    if BROWSER_POOL is None:
+        return {"enabled": False}
+    return {"enabled": True, **BROWSER_POOL.snapshot()}
+
+
+@app.get("/webhook/metrics")
+async def webhook_metrics():
+    return WEBHOOK.snapshot()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latency histograms and webhook counters in Prometheus text format."""
+    lines = [STAGE_TIMINGS.render()]
+    for name, value in WEBHOOK.metrics.items():
+        lines.append(f"# TYPE automatizador_webhook_{name} gauge\n")
+        lines.append(f"automatizador_webhook_{name} {value}\n")
+    return PlainTextResponse("".join(lines), media_type="text/plain; version=0.0.4")